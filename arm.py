@@ -11,8 +11,10 @@
 This file contains the Arm class
 """
 
+import numpy as np
 from const import *
-from armLink import ArmLink
+from armLink import ArmLink, getOffsetTable
+from geometry import computeCoordinate, computeCoordinates
 
 class Arm:
     def __init__(self, armBasePos, armLinkSpec):
@@ -38,6 +40,8 @@ class Arm:
             armLink = ArmLink(base, length, totalRelativeAngle % 360, distance)
             self.__armLinks.append(armLink)
             base = armLink.getEnd()        
+        self.__armPos = None
+        self.__armPosDist = None
 
 
     def getBase(self):
@@ -55,20 +59,97 @@ class Arm:
            For example, if there are two arm links, the return value would be '
            [ [(x1, y1), (x2, y2)], 
              [(x2, y2), (x3, y3)] ]
+           The list is kept until the angles change, callers must not modify it.
         """
-        info = []
-        for armLink in self.__armLinks:
-            info.append((armLink.getBase(), armLink.getEnd()))
-        return info
+        if self.__armPos is None:
+            self.__armPos = [(armLink.getBase(), armLink.getEnd()) for armLink in self.__armLinks]
+        return self.__armPos
     
     def getArmPosDist(self):
         """This function returns (start, end) of all arm links with the padding distance of the arm
            For example, if there are two arm links, the return value would be '
            [ [(x1, y1), (x2, y2), distance], 
              [(x2, y2), (x3, y3), distance] ]
+           The list is kept until the angles change, callers must not modify it.
         """
-        info = [(armLink.getBase(), armLink.getEnd(), armLink.getDistance()) for armLink in self.__armLinks]
-        return info
+        if self.__armPosDist is None:
+            self.__armPosDist = [(armLink.getBase(), armLink.getEnd(), armLink.getDistance()) for armLink in self.__armLinks]
+        return self.__armPosDist
+
+    def kinematics(self, angles):
+        """This function returns the joint positions, base first, of the arm at
+           the given relative angles without changing the arm, so one arm can
+           be shared by callers evaluating different angles. Angles beyond the
+           number of links are ignored and limits are not checked.
+
+            Args:
+                angles: (alpha, beta, gamma) of one pose, or a (numPoses, numLinks)
+                        array of many poses
+
+            Return:
+                tuple of (x, y) for one pose, or a (numPoses, numLinks + 1, 2)
+                array for many
+        """
+        if np.ndim(angles) == 2:
+            jointsX, jointsY = self.jointPositions(np.asarray(angles))
+            return np.stack((jointsX, jointsY), axis=-1)
+
+        joint = self.getBase()
+        joints = [joint]
+        totalAngle = 0
+        for armLink, angle in zip(self.__armLinks, angles):
+            totalAngle += angle
+            if isinstance(totalAngle, (int, np.integer)):
+                dx, dy = getOffsetTable(armLink.getLength())[0][totalAngle % 360]
+                joint = (joint[0] + dx, joint[1] + dy)
+            else:
+                joint = computeCoordinate(joint, armLink.getLength(), totalAngle % 360)
+            joints.append(joint)
+        return tuple(joints)
+
+    def jointPositions(self, angles):
+        """This function computes the joint positions of the arm for many angle combinations
+
+            Args:
+                angles (ndarray): (numPoses, numLinks) relative angles (alpha, beta, gamma)
+
+            Return:
+                (jointsX, jointsY): (numPoses, numLinks + 1) coordinates, base first
+        """
+        numPoses = angles.shape[0]
+        base = self.getBase()
+        jointsX = np.empty((numPoses, len(self.__armLinks) + 1), dtype=np.int64)
+        jointsY = np.empty((numPoses, len(self.__armLinks) + 1), dtype=np.int64)
+        jointsX[:, 0] = base[0]
+        jointsY[:, 0] = base[1]
+        totalAngle = np.zeros(numPoses, dtype=angles.dtype)
+        for i, armLink in enumerate(self.__armLinks):
+            totalAngle = totalAngle + angles[:, i]
+            if np.issubdtype(totalAngle.dtype, np.integer):
+                # Whole angles: look the link offsets up in the link's table
+                offset = armLink.getOffsets()[totalAngle % 360]
+                jointsX[:, i + 1] = jointsX[:, i] + offset[:, 0]
+                jointsY[:, i + 1] = jointsY[:, i] + offset[:, 1]
+            else:
+                jointsX[:, i + 1], jointsY[:, i + 1] = computeCoordinates(
+                    jointsX[:, i], jointsY[:, i], armLink.getLength(), totalAngle % 360)
+        return jointsX, jointsY
+
+    def getArmLengths(self):
+        """This function returns the length of all arm links
+        """
+        return [armLink.getLength() for armLink in self.__armLinks]
+
+    def getArmOffsets(self):
+        """This function returns, for all arm links, the (360, 2) table of (dx, dy)
+           offsets from link base to link end for every whole absolute angle
+        """
+        return [armLink.getOffsets() for armLink in self.__armLinks]
+
+    def getArmDistances(self):
+        """This function returns the padding distance of all arm links
+        """
+        return [armLink.getDistance() for armLink in self.__armLinks]
 
     def getArmAngle(self):
         """This function returns relative angles of all arm links.
@@ -90,13 +171,13 @@ class Arm:
         """This function sets angles(alpha, beta, gamma) for all arm links
         """
         angles = angles[:self.getNumArmLinks()]
-        print(angles[0], angles[1])
         for i in range(len(angles)):
-            print("angs:", self.__armLimit[i])
             if angles[i] < min(self.__armLimit[i]) or angles[i] > max(self.__armLimit[i]):
                 return False
 
         self.__armRelativeAngle = angles
+        self.__armPos = None
+        self.__armPosDist = None
         totalAngle = 0
         base = self.getBase()
         for i in range(len(self.__armRelativeAngle)):
@@ -106,3 +187,30 @@ class Arm:
             base = self.__armLinks[i].getEnd()
 
         return True
+
+
+if __name__ == '__main__':
+    import itertools
+    from util import loadMapConfig
+
+    # kinematics must give the joints setArmAngle moves the arm to, one pose
+    # at a time and in batches, and must leave the arm where it was.
+    for configfile, map_name in [("test_config.txt", "Test1"), ("test_config_part4.txt", "Test1")]:
+        window, armBase, armLinks, obstacles, goals = loadMapConfig(configfile, map_name)
+        arm = Arm(armBase, armLinks)
+        start = list(arm.getArmAngle())
+        limits = arm.getArmLimit()
+        poses = list(itertools.product(*[range(limit[0], limit[1] + 1, 7) for limit in limits]))
+        batch = arm.kinematics(np.array(poses))
+        for pose, joints in zip(poses, batch):
+            expected = Arm(armBase, armLinks)
+            expected.setArmAngle(pose)
+            armPos = expected.getArmPos()
+            assert arm.kinematics(pose) == (armPos[0][0],) + tuple(end for _, end in armPos)
+            assert arm.kinematics(pose) == tuple(map(tuple, joints.tolist()))
+            if all(angle < limit[1] for angle, limit in zip(pose, limits)):
+                expected.setArmAngle([angle + 0.5 for angle in pose])
+                assert arm.kinematics([angle + 0.5 for angle in pose])[-1] == expected.getEnd()
+        assert list(arm.getArmAngle()) == start
+
+    print("Test passed\n")
@@ -11,22 +11,43 @@
 This file contains the ArmLink class
 """
 
+import numpy as np
 from geometry import *
 
+# Offset tables shared by all links of the same length, see getOffsetTable
+_offsetTables = {}
+
+def getOffsetTable(length):
+    """This function returns (offsets, offsetArray) for a link of the given length:
+       the (dx, dy) from link base to link end for every whole absolute angle
+       0..359, as a list of tuples and as a (360, 2) array. The offsets are
+       computed with computeCoordinate, so lookups match it exactly.
+    """
+    if length not in _offsetTables:
+        offsets = [computeCoordinate((0, 0), length, a) for a in range(360)]
+        _offsetTables[length] = (offsets, np.array(offsets, dtype=np.int64))
+    return _offsetTables[length]
+
 class ArmLink:
+    # Links are created once per arm and only ever hold these fields
+    __slots__ = ('__base', '__length', '__angle', '__distance', '__end')
+
     def __init__(self, base, length, angle, distance=0):
         # This angle is absolute angle, not alpha/beta/gamma
         self.__base = base
         self.__length = length        
         self.__angle = angle
         self.__distance = distance
+        self.__end = None
 
     def setBase(self, base):
         self.__base = base                
+        self.__end = None
 
     def setAngle(self, angle):
         # This angle is absolute angle, not alpha or beta or gamma        
         self.__angle = angle             
+        self.__end = None
 
     def getBase(self):
         return self.__base
@@ -40,12 +61,36 @@ class ArmLink:
     def getDistance(self):
         return self.__distance
 
+    def getOffsets(self):
+        """This function returns the (360, 2) array of (dx, dy) offsets from base
+           to end for every whole absolute angle
+        """
+        return getOffsetTable(self.__length)[1]
+
     def computeEnd(self):
         """This function computes the end position of this arm link for the given angle.
            Note that the angle here is counter-clockwise from the x-axis. 
+           Whole angles are looked up in the offset table, others are computed.
         """        
-        self.__end = computeCoordinate(self.__base, self.__length, self.__angle)
+        angle = self.__angle
+        if isinstance(angle, (int, np.integer)) and 0 <= angle < 360:
+            dx, dy = getOffsetTable(self.__length)[0][angle]
+            self.__end = (self.__base[0] + dx, self.__base[1] + dy)
+        else:
+            self.__end = computeCoordinate(self.__base, self.__length, angle)
 
     def getEnd(self):
-        self.computeEnd()
-        return self.__end  
\ No newline at end of file
+        if self.__end is None:
+            self.computeEnd()
+        return self.__end
+
+
+if __name__ == '__main__':
+    for length in [25, 50, 80, 100]:
+        for angle in range(360):
+            armLink = ArmLink((150, 190), length, angle)
+            assert armLink.getEnd() == computeCoordinate((150, 190), length, angle)
+            armLink.setAngle(angle + 0.5)
+            assert armLink.getEnd() == computeCoordinate((150, 190), length, angle + 0.5)
+
+    print("Test passed\n")
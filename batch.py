@@ -0,0 +1,130 @@
+# batch.py
+# ---------------
+# Licensing Information:  You are free to use or extend this projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to the University of Illinois at Urbana-Champaign
+
+"""
+This file contains the headless batch planner.
+
+It plans many (config file, map, granularity, method) jobs on a process pool
+without importing pygame, and writes one JSON line per job with the path and
+its statistics. Jobs come from a JSON lines file, one object per line with
+the keys config, map, granularity and method, or from --job arguments:
+
+    python batch.py --job test_config.txt Test1 2 bfs --job test_config.txt Test2 2 astar
+    python batch.py --jobs jobs.jsonl --workers 8 --output results.jsonl --maze-dir mazes
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from arm import Arm
+from transform import transformToMaze, transformToMazeCached
+from search import search
+from const import *
+from util import *
+
+
+def runJob(job, mazeDir=None, mazeCache=None):
+    """This function plans one job and returns its result as a dict
+
+        Args:
+            job (dict): config, map, granularity and method of the job
+            mazeDir (str): directory to save the maze to, or None
+            mazeCache (str): maze cache directory for transformToMazeCached, or None
+
+        Return:
+            dict: the job with the path and statistics, or with an error message
+    """
+    result = dict(job)
+    output = io.StringIO()
+    metrics.reset()
+    metrics.enable()
+    try:
+        with contextlib.redirect_stdout(output):
+            window, armBase, armLinks, obstacles, goals = loadMapConfig(job["config"], job["map"])
+            arm = Arm(armBase, armLinks)
+            granularity = job.get("granularity", DEFAULT_GRANULARITY)
+
+            start = time.perf_counter()
+            if mazeCache:
+                maze = transformToMazeCached(arm, goals, obstacles, window, granularity, mazeCache)
+            else:
+                maze = transformToMaze(arm, goals, obstacles, window, granularity)
+            result["transform_seconds"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            path = search(maze, job.get("method", "bfs"))
+            result["search_seconds"] = time.perf_counter() - start
+
+        result["path"] = path
+        result["path_length"] = len(path)
+        result["status"] = maze.isValidPath(path) if path else "No path found"
+        result["cells"] = len(maze.getCells())
+        result["counters"] = dict(metrics.counters)
+        if mazeDir:
+            result["maze_file"] = os.path.join(mazeDir, "%s_%s_%s.txt" % (
+                os.path.splitext(os.path.basename(job["config"]))[0], job["map"], granularity))
+            maze.saveToFile(result["maze_file"])
+    except SystemExit as e:
+        # Maze and Arm report bad maps by printing and raising SystemExit
+        message = output.getvalue().strip() or str(e) or repr(e)
+        result["error"] = message.splitlines()[-1]
+    except Exception as e:
+        # Anything printed before, such as "no path", is not the error
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    finally:
+        metrics.disable()
+    return result
+
+
+def readJobs(filename):
+    """This function returns the jobs of a JSON lines file, '-' for stdin
+    """
+    f = sys.stdin if filename == '-' else open(filename)
+    with f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CS440 MP2 Robotic Arm headless batch planner')
+    parser.add_argument('--jobs', dest="jobsFile", type=str, default=None,
+                        help='JSON lines file of jobs, - for stdin')
+    parser.add_argument('--job', dest="jobs", nargs=4, action='append', default=[],
+                        metavar=('CONFIG', 'MAP', 'GRANULARITY', 'METHOD'),
+                        help='add a single job, can be repeated')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of planning processes - default one per CPU')
+    parser.add_argument('--output', type=str, default=None,
+                        help='JSON lines file to write results to - default stdout')
+    parser.add_argument('--maze-dir', dest="mazeDir", type=str, default=None,
+                        help='directory to save every constructed maze to - default not saved')
+    parser.add_argument('--maze-cache', dest="mazeCache", type=str, default=None,
+                        help='directory to keep constructed mazes in and reuse them from - default not cached')
+    args = parser.parse_args()
+
+    jobs = readJobs(args.jobsFile) if args.jobsFile else []
+    jobs += [{"config": config, "map": map_name, "granularity": int(granularity), "method": method}
+             for config, map_name, granularity, method in args.jobs]
+    if not jobs:
+        parser.error("no jobs given, use --jobs or --job")
+    if args.mazeDir:
+        os.makedirs(args.mazeDir, exist_ok=True)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(runJob, job, args.mazeDir, args.mazeCache) for job in jobs]
+        for future in futures:
+            out.write(json.dumps(future.result()) + "\n")
+            out.flush()
+    if out is not sys.stdout:
+        out.close()
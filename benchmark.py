@@ -0,0 +1,251 @@
+# benchmark.py
+# ---------------
+# Licensing Information:  You are free to use or extend this projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to the University of Illinois at Urbana-Champaign
+
+"""
+This file contains the performance benchmark for maze construction and search.
+
+Every map of the shipped configuration files is transformed and searched at
+a sweep of granularities. Wall times, peak traced memory, cells per second
+and states expanded are written to a JSON file and compared against a stored
+baseline. A digest of every maze and the number of cells that differ from
+the mazes in SampleOutputs are checked as a correctness gate.
+
+Wall times depend on the machine, so a fixed calibration workload is timed
+with every run and the baseline times are scaled by how much slower or
+faster it ran. Slower timings are reported as warnings; only --strict-timing
+makes them fail the run.
+
+    python benchmark.py                      # run and compare to the baseline
+    python benchmark.py --update-baseline    # run and store a new baseline
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+import metrics
+from arm import Arm
+from transform import transformToMaze
+from search import search
+from const import *
+from util import *
+
+# Granularities swept per configuration file. The 3-link maps of part 4 grow
+# with the cube of 1/granularity and are only run at coarse settings.
+DEFAULT_SWEEP = {
+    "test_config.txt": [1, 2, 5],
+    "test_config_part4.txt": [5, 10],
+}
+
+# Mazes in SampleOutputs and the runs that produce them, see README.md
+SAMPLE_OUTPUTS = {
+    ("test_config.txt", "Test1", 2): "SampleOutputs/test1.txt",
+    ("test_config.txt", "Test2", 2): "SampleOutputs/test2.txt",
+    ("test_config.txt", "BasicMap", 2): "SampleOutputs/basicmap.txt",
+}
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+# A timing regresses when it exceeds threshold * scaled baseline + slack
+# seconds; the slack keeps millisecond-scale cases from flapping.
+DEFAULT_THRESHOLD = 1.5
+TIME_SLACK = 0.05
+DEFAULT_REPEAT = 3
+CALIBRATION_REPEAT = 5
+
+
+def calibrate(repeat=CALIBRATION_REPEAT):
+    """This function returns the fastest of repeat runs of a fixed workload of
+       Python loops and NumPy operations, which does not depend on this project
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total = 0
+        for i in range(300000):
+            total += i % 7
+        grid = np.arange(1000000, dtype=np.float64).reshape(1000, 1000)
+        for _ in range(5):
+            grid = np.sqrt(grid * grid + 1.0)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def runCase(configfile, map_name, granularity, method, repeat, measureMemory):
+    """This function transforms and searches one map and returns its measurements
+    """
+    window, armBase, armLinks, obstacles, goals = loadMapConfig(configfile, map_name)
+
+    transformTimes, searchTimes = [], []
+    for _ in range(repeat):
+        metrics.reset()
+        metrics.enable()
+        start = time.perf_counter()
+        maze = transformToMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+        transformTimes.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            path = search(maze, method)
+        searchTimes.append(time.perf_counter() - start)
+        metrics.disable()
+
+    cells = len(maze.getCells())
+    result = {
+        "config": configfile,
+        "map": map_name,
+        "granularity": granularity,
+        "method": method,
+        "dimensions": list(maze.getDimensions()),
+        "cells": cells,
+        "transform_seconds": min(transformTimes),
+        "search_seconds": min(searchTimes),
+        "cells_per_second": cells / max(min(transformTimes), 1e-9),
+        "states_expanded": metrics.counters.get('states_expanded', 0),
+        "path_length": len(path),
+        "maze_sha256": hashlib.sha256(maze.getCells().tobytes()).hexdigest(),
+    }
+
+    if measureMemory:
+        # tracemalloc slows Python down, so memory is measured in its own run.
+        tracemalloc.start()
+        maze = transformToMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+        with contextlib.redirect_stdout(io.StringIO()):
+            search(maze, method)
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    sample = SAMPLE_OUTPUTS.get((configfile, map_name, granularity))
+    if sample:
+        result["sample_mismatches"] = countSampleMismatches(maze, sample)
+    return result
+
+
+def countSampleMismatches(maze, sampleFile):
+    """This function returns the number of cells in which the maze differs from
+       a maze file written by Maze.saveToFile
+    """
+    with open(sampleFile) as f:
+        rows = f.read().split("\n")
+    expected = maze.get_map()
+    mismatches = 0
+    for alpha in range(len(expected)):
+        for beta in range(len(expected[alpha])):
+            if beta >= len(rows) or alpha >= len(rows[beta]) or rows[beta][alpha] != expected[alpha][beta]:
+                mismatches += 1
+    return mismatches
+
+
+def caseKey(case):
+    return (case["config"], case["map"], case["granularity"], case["method"])
+
+
+def compareToBaseline(results, baseline, threshold):
+    """This function returns (failures, warnings), lists of messages for the
+       regressions of results against baseline. More states expanded, more
+       memory, and any change in the mazes or paths are failures; phases
+       slower than the baseline scaled by the calibration runs are warnings.
+    """
+    failures, warnings = [], []
+    scale = 1.0
+    if "calibration_seconds" in results and "calibration_seconds" in baseline:
+        scale = results["calibration_seconds"] / baseline["calibration_seconds"]
+    baseCases = {caseKey(case): case for case in baseline["cases"]}
+    for case in results["cases"]:
+        base = baseCases.get(caseKey(case))
+        name = "%s %s granularity=%d %s" % caseKey(case)
+        if base is None:
+            continue
+        for key in ["maze_sha256", "path_length", "sample_mismatches"]:
+            if case.get(key) != base.get(key):
+                failures.append("%s: %s changed from %s to %s" % (name, key, base.get(key), case.get(key)))
+        for key in ["transform_seconds", "search_seconds"]:
+            if case[key] > base[key] * scale * threshold + TIME_SLACK:
+                warnings.append("%s: %s regressed from %.3f to %.3f (baseline scaled by %.2f)" % (
+                    name, key, base[key], case[key], scale))
+        if case["states_expanded"] > base["states_expanded"]:
+            failures.append("%s: states_expanded grew from %d to %d" % (name, base["states_expanded"], case["states_expanded"]))
+        if "peak_memory_bytes" in case and "peak_memory_bytes" in base and \
+                case["peak_memory_bytes"] > base["peak_memory_bytes"] * threshold:
+            failures.append("%s: peak_memory_bytes grew from %d to %d" % (name, base["peak_memory_bytes"], case["peak_memory_bytes"]))
+    return failures, warnings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CS440 MP2 Robotic Arm benchmark')
+    parser.add_argument('--config', dest="configfiles", nargs='+', default=list(DEFAULT_SWEEP),
+                        help='configuration files to benchmark - default ' + ' '.join(DEFAULT_SWEEP))
+    parser.add_argument('--granularity', dest="granularities", type=int, nargs='+', default=None,
+                        help='granularities to sweep - default per configuration file')
+    parser.add_argument('--method', dest="methods", nargs='+', default=["bfs"],
+                        help='search methods to run - default bfs')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='runs per case, the fastest is kept - default ' + str(DEFAULT_REPEAT))
+    parser.add_argument('--no-memory', dest="memory", default=True, action="store_false",
+                        help='skip the peak memory measurement')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help='results file - default ' + DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='baseline results to compare against - default ' + DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown factor against the baseline - default ' + str(DEFAULT_THRESHOLD))
+    parser.add_argument('--strict-timing', dest="strictTiming", default=False, action="store_true",
+                        help='fail on slower timings instead of warning about them')
+    parser.add_argument('--update-baseline', dest="updateBaseline", default=False, action="store_true",
+                        help='store the results as the new baseline instead of comparing')
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "calibration_seconds": calibrate(),
+        "cases": [],
+    }
+    for configfile in args.configfiles:
+        for map_name in getMapNames(configfile):
+            for granularity in args.granularities or DEFAULT_SWEEP.get(configfile, [DEFAULT_GRANULARITY]):
+                for method in args.methods:
+                    case = runCase(configfile, map_name, granularity, method, args.repeat, args.memory)
+                    results["cases"].append(case)
+                    print("%-22s %-9s g=%-3d %-7s %9d cells %8.3fs transform %8.3fs search %8d states" % (
+                        configfile, map_name, granularity, method, case["cells"],
+                        case["transform_seconds"], case["search_seconds"], case["states_expanded"]))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.updateBaseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print("Baseline written to", args.baseline)
+        sys.exit(0)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print("No baseline at", args.baseline)
+        sys.exit(0)
+
+    failures, warnings = compareToBaseline(results, baseline, args.threshold)
+    if args.strictTiming:
+        failures, warnings = failures + warnings, []
+    for warning in warnings:
+        print("WARNING", warning)
+    for failure in failures:
+        print("REGRESSION", failure)
+    if failures:
+        sys.exit(1)
+    print("No regressions against", args.baseline)
@@ -26,9 +26,73 @@ START_CHAR = 'P'
 OBJECTIVE_CHAR = '.'
 SPACE_CHAR = ' '
 
+# Maze cells are stored as the byte value of their character
+WALL_CODE = ord(WALL_CHAR)
+START_CODE = ord(START_CHAR)
+OBJECTIVE_CODE = ord(OBJECTIVE_CHAR)
+SPACE_CODE = ord(SPACE_CHAR)
+# Cells of a LazyMaze that have not been classified yet
+UNKNOWN_CODE = 0
+
 ALPHA = 0
 BETA = 1
 GAMMA = 2
 
 DEFAULT_FPS = 30
 DEFAULT_GRANULARITY = 2
+
+# Weight on the heuristic used by the weighted A* search method
+DEFAULT_WASTAR_WEIGHT = 2.0
+
+# Number of configuration-space cells classified per NumPy pass, which bounds
+# the size of the temporary (cells x links x objects) arrays.
+CELL_CHUNK_SIZE = 65536
+
+# Bump when the classification rules change, so that cached mazes built by
+# transformToMazeCached are no longer used
+MAZE_CACHE_VERSION = 1
+
+# Edge length, in cells per angle, of the tiles a LazyMaze classifies at once
+LAZY_TILE_SIZE = 8
+
+# Scenes with at least this many obstacles or goals are collision tested
+# through a CircleGrid spatial index instead of against every circle
+SPATIAL_INDEX_MIN_CIRCLES = 8
+
+# Edge length, in cells per angle, of the coarsest blocks classified by
+# transformToMazeMultires; halved at every level, so keep it a power of two
+MULTIRES_BLOCK_SIZE = 16
+# Bound on how far a truncated integer joint position can be from the exact
+# one, per link (a little over sqrt(2))
+MULTIRES_TRUNCATION_SLACK = 1.5
+
+# Binary maze files written by Maze.saveToBinaryFile start with this magic
+# string; the cells start at a multiple of MAZE_FILE_ALIGNMENT bytes and are
+# written MAZE_FILE_WRITE_SIZE bytes at a time
+MAZE_FILE_MAGIC = b"MP2MAZE\n"
+MAZE_FILE_VERSION = 1
+MAZE_FILE_ALIGNMENT = 64
+MAZE_FILE_WRITE_SIZE = 1 << 20
+BINARY_MAZE_SUFFIX = ".maze"
+
+# Planning service (server.py): default TCP port, and the bytes of mazes it
+# keeps in memory before dropping the least recently used ones
+SERVER_PORT = 8440
+SERVER_CACHE_BYTES = 256 * 1024 * 1024
+# Longest request line the service reads, inline scenes included
+SERVER_LINE_LIMIT = 16 * 1024 * 1024
+
+# Sampling planners (sampling.py): default seed, budget of samples and
+# seconds, longest edge in degrees, roadmap neighbors per node, objectives the
+# goal tree and roadmap start from and the samples drawn to find them, and
+# roadmap nodes sampled at first
+SAMPLING_SEED = 0
+SAMPLING_MAX_SAMPLES = 50000
+SAMPLING_TIME_LIMIT = 30.0
+SAMPLING_MAX_EDGE_DEGREES = 40
+SAMPLING_NEIGHBORS = 10
+SAMPLING_GOAL_ROOTS = 32
+SAMPLING_GOAL_SAMPLES = 20000
+SAMPLING_ROADMAP_SIZE = 500
+# Shortcutting only tries waypoints this many edge lengths ahead
+SAMPLING_SHORTCUT_EDGES = 4
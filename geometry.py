@@ -13,6 +13,8 @@ This file contains geometry functions that relate with Part1 in MP2.
 
 import math
 import numpy as np
+import metrics
+from spatial import CircleGrid
 from const import *
 
 
@@ -91,7 +93,12 @@ def doesArmTouchObjects(armPosDist, objects, isGoal=False):
     #for segment in segs:
     for link in armPosDist:
         #for object in objs:
-        for object in objects:
+        candidates = objects
+        if isinstance(objects, CircleGrid):
+            reach = (0 if isGoal else link[2]) + 1
+            candidates = objects.candidates(min(link[0][0], link[1][0]) - reach, min(link[0][1], link[1][1]) - reach,
+                                            max(link[0][0], link[1][0]) + reach, max(link[0][1], link[1][1]) + reach)
+        for object in candidates:
             '''
             #calc point of intersection on line
             mb = getMandBPoints(link[0], link[1])
@@ -139,6 +146,137 @@ def doesArmTipTouchGoals(armEnd, goals):
     return False
 
 
+def computeCoordinates(startX, startY, length, angles):
+    """Vectorized computeCoordinate for arrays of link bases and absolute angles
+
+        Args:
+            startX (ndarray): x-coordinates of the link bases
+            startY (ndarray): y-coordinates of the link bases
+            length (int): length of the link
+            angles (ndarray): absolute angles of the link, same shape as startX
+
+        Return:
+            (endX, endY) arrays, equal element-wise to computeCoordinate.
+    """
+    # Only a handful of distinct angles occur on a grid, so evaluate the
+    # trigonometry once per distinct angle and scatter the offsets back.
+    uniqueAngles, inverse = np.unique(angles, return_inverse=True)
+    d_x = np.trunc(length * np.cos(np.radians(uniqueAngles))).astype(np.int64)
+    d_y = np.trunc(length * np.sin(np.radians(uniqueAngles))).astype(np.int64)
+    inverse = inverse.reshape(np.shape(angles))
+    return startX + d_x[inverse], startY - d_y[inverse]
+
+
+def segmentCircleDistances(x1, y1, x2, y2, x3, y3):
+    """Vectorized dist(): distance from points (x3, y3) to segments (x1, y1)-(x2, y2)
+
+        All arguments broadcast against each other. The arithmetic follows
+        dist() step by step so that the results compare equal.
+    """
+    px = x2 - x1
+    py = y2 - y1
+    norm = px * px + py * py
+    u = ((x3 - x1) * px + (y3 - y1) * py) / norm.astype(np.float64)
+    u = np.clip(u, 0, 1)
+    dx = (x1 + u * px) - x3
+    dy = (y1 + u * py) - y3
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def doArmsTouchObjects(jointsX, jointsY, distances, objects, isGoal=False):
+    """Vectorized doesArmTouchObjects over many arm poses at once
+
+        Args:
+            jointsX (ndarray): (numPoses, numLinks + 1) x-coordinates of the joints
+            jointsY (ndarray): (numPoses, numLinks + 1) y-coordinates of the joints
+            distances (list): padding distance of every link
+            objects (list): [(x, y, r)] of obstacles or goals, or a CircleGrid of them
+            isGoal (bool): ignore the link padding, as doesArmTouchObjects does
+
+        Return:
+            bool ndarray of shape (numPoses,)
+    """
+    touched = np.zeros(jointsX.shape[0], dtype=bool)
+    if len(objects) == 0:
+        return touched
+    if isinstance(objects, CircleGrid):
+        return doArmsTouchIndexedObjects(jointsX, jointsY, distances, objects, isGoal)
+    if metrics.enabled:
+        metrics.count('collision_tests', jointsX.shape[0] * (jointsX.shape[1] - 1) * len(objects))
+    objects = np.asarray(objects, dtype=np.float64)
+    cx, cy, radius = objects[:, 0], objects[:, 1], objects[:, 2]
+    for i in range(jointsX.shape[1] - 1):
+        x1, y1 = jointsX[:, i, None], jointsY[:, i, None]
+        x2, y2 = jointsX[:, i + 1, None], jointsY[:, i + 1, None]
+        limit = radius + (0 if isGoal else distances[i])
+        distance = segmentCircleDistances(x1, y1, x2, y2, cx, cy)
+        hit = distance <= limit
+        # dist() takes the square root with float pow, which may differ from
+        # np.sqrt in the last ulp; redo the few borderline pairs the scalar way.
+        borderline = np.nonzero(np.abs(distance - limit) <= 1e-9 * np.maximum(limit, 1))
+        for pose, obj in zip(*borderline):
+            hit[pose, obj] = dist(x1[pose, 0], y1[pose, 0], x2[pose, 0], y2[pose, 0],
+                                  cx[obj], cy[obj]) <= limit[obj]
+        touched |= hit.any(axis=1)
+    return touched
+
+
+def doArmsTouchIndexedObjects(jointsX, jointsY, distances, index, isGoal=False):
+    """doArmsTouchObjects for a CircleGrid: every link is only tested against
+       the circles near its bounding box, grown by the padding
+    """
+    touched = np.zeros(jointsX.shape[0], dtype=bool)
+    cx, cy, radius = index.getArrays()
+    for i in range(jointsX.shape[1] - 1):
+        poses = np.nonzero(~touched)[0]
+        x1, y1 = jointsX[poses, i], jointsY[poses, i]
+        x2, y2 = jointsX[poses, i + 1], jointsY[poses, i + 1]
+        # One unit of slack keeps the lookup conservative against rounding
+        reach = (0 if isGoal else distances[i]) + 1
+        pair, obj = index.candidatePairs(np.minimum(x1, x2) - reach, np.minimum(y1, y2) - reach,
+                                         np.maximum(x1, x2) + reach, np.maximum(y1, y2) + reach)
+        if metrics.enabled:
+            metrics.count('collision_tests', len(pair))
+        limit = radius[obj] + (0 if isGoal else distances[i])
+        distance = segmentCircleDistances(x1[pair], y1[pair], x2[pair], y2[pair], cx[obj], cy[obj])
+        hit = distance <= limit
+        for k in np.nonzero(np.abs(distance - limit) <= 1e-9 * np.maximum(limit, 1))[0]:
+            hit[k] = dist(x1[pair[k]], y1[pair[k]], x2[pair[k]], y2[pair[k]], cx[obj[k]], cy[obj[k]]) <= limit[k]
+        touched[poses[pair[hit]]] = True
+    return touched
+
+
+def doArmTipsTouchGoals(tipX, tipY, goals):
+    """Vectorized doesArmTipTouchGoals, returns a bool ndarray shaped like tipX
+    """
+    touched = np.zeros(np.shape(tipX), dtype=bool)
+    if isinstance(goals, CircleGrid):
+        tipX, tipY = np.ravel(tipX), np.ravel(tipY)
+        tip, goal = goals.candidatePairs(tipX - 1, tipY - 1, tipX + 1, tipY + 1)
+        if metrics.enabled:
+            metrics.count('goal_tests', len(tip))
+        gx, gy, radius = goals.getArrays()
+        dx = gx[goal] - tipX[tip]
+        dy = gy[goal] - tipY[tip]
+        hit = np.sqrt((dx * dx + dy * dy).astype(np.float64)) <= radius[goal]
+        touched.reshape(-1)[tip[hit]] = True
+        return touched
+    if metrics.enabled:
+        metrics.count('goal_tests', np.size(tipX) * len(goals))
+    for g in goals:
+        dx = g[0] - tipX
+        dy = g[1] - tipY
+        touched |= np.sqrt((dx * dx + dy * dy).astype(np.float64)) <= g[2]
+    return touched
+
+
+def areArmsWithinWindow(jointsX, jointsY, window):
+    """Vectorized isArmWithinWindow over (numPoses, numJoints) joint arrays
+    """
+    inside = (jointsX >= 0) & (jointsX <= window[0]) & (jointsY >= 0) & (jointsY <= window[1])
+    return inside.all(axis=1)
+
+
 def isArmWithinWindow(armPos, window):
     """Determine whether the given arm stays in the window
 
@@ -12,27 +12,44 @@ This file contains the Maze class, which reads in a maze file and creates
 a representation of the maze that is exposed through a simple interface.
 """
 
-import copy
+import json
+import numpy as np
+from itertools import chain
 from const import *
 from util import *
 
 class Maze:
-    # Initializes the Maze object by reading the maze from a file
-    def __init__(self, input_map, offsets, granularity):        
-        self.__start = None
-        self.__objective = []        
+    # Initializes the Maze object from a grid of maze characters with one
+    # dimension per arm link. The grid can be nested lists of characters or a
+    # NumPy array; it is stored as a dense uint8 array of character codes,
+    # one byte per cell.
+    #
+    # Besides the angle-based interface, cells can be addressed by their flat
+    # row-major index into that array. The *Flat methods skip the angle
+    # conversion entirely and are what the search functions use; the angle
+    # methods are thin wrappers around them.
+    #
+    # The start and objectives are found by scanning the grid unless they are
+    # given, which lets loadMaze open a memory-mapped maze without reading it.
+    def __init__(self, input_map, offsets, granularity, start=None, objectives=None):        
+        self.__start = start
+        self.__objective = [] if objectives is None else objectives
 
         self.offsets = offsets
         self.granularity = granularity
-    
-        self.__dimensions = [len(input_map), len(input_map[0])]        
-        self.__map = input_map
-        for x in range(self.__dimensions[ALPHA]):
-            for y in range(self.__dimensions[BETA]):                
-                if self.__map[x][y] == START_CHAR:                    
-                    self.__start = idxToAngle((x, y), self.offsets, granularity)
-                elif self.__map[x][y] == OBJECTIVE_CHAR:
-                    self.__objective.append(idxToAngle((x, y), self.offsets, granularity))
+
+        if isinstance(input_map, np.ndarray) and input_map.dtype == np.uint8:
+            self.setCells(input_map)
+        else:
+            self.setCells(np.ascontiguousarray(input_map, dtype='<U1').view(np.uint32).astype(np.uint8))
+
+        if start is None:
+            starts = np.argwhere(self.__map == START_CODE)
+            if len(starts) > 0:
+                self.__start = idxToAngle(tuple(starts[0]), self.offsets, granularity)
+        if objectives is None:
+            for idx in np.argwhere(self.__map == OBJECTIVE_CODE):
+                self.__objective.append(idxToAngle(tuple(idx), self.offsets, granularity))
 
         if not self.__start:
             print("Maze has no start")            
@@ -42,68 +59,173 @@ class Maze:
             print("Maze has no objectives")
             raise SystemExit
 
-    def getChar(self, alpha, beta):
-        x, y = angleToIdx((alpha, beta), self.offsets, self.granularity)
-        return self.__map[x][y]
+    # Sets the grid of uint8 character codes the maze is backed by
+    def setCells(self, grid):
+        self.__map = np.ascontiguousarray(grid)
+        self.__dimensions = list(self.__map.shape)
+        self.__cells = self.__map.reshape(-1)
+        self.__cellView = memoryview(self.__cells)
+        self.__strides = tuple(int(np.prod(self.__dimensions[i+1:])) for i in range(len(self.__dimensions)))
+        # (stride, size) of every dimension, used by getNeighborsFlat
+        self.__axes = tuple(zip(self.__strides, self.__dimensions))
+        # Filled in by computeGoalField, and stale once the cells change
+        self.__goalDistances = None
+        self.__goalDistanceView = None
+        self.__components = None
+        self.__jumpTables = None
+        # Built from getObjectives by getObjectiveIndex
+        self.__objectiveIndex = None
+
+    # Returns the flat index of the given angles, or -1 if they are outside the maze
+    def angleToFlat(self, angles):
+        flat = 0
+        for i in range(len(angles)):
+            idx = int((angles[i] - self.offsets[i]) / self.granularity)
+            if idx < 0 or idx >= self.__dimensions[i]:
+                return -1
+            flat += idx * self.__strides[i]
+        return flat
+
+    # Returns the array index (one entry per angle) of the given flat index
+    def flatToIdx(self, flat):
+        return tuple(flat // stride % size for stride, size in self.__axes)
+
+    # Returns the angles (alpha, beta, gamma) of the given flat index
+    def flatToAngle(self, flat):
+        angles = []
+        for stride, size in self.__axes:
+            angles.append(int((flat // stride % size) * self.granularity + self.offsets[len(angles)]))
+        return tuple(angles)
+
+    # Returns the flat index of the start position
+    def getStartFlat(self):
+        return self.angleToFlat(self.__start)
+
+    def isWallFlat(self, flat):
+        return self.__cellView[flat] == WALL_CODE
+
+    def isObjectiveFlat(self, flat):
+        return self.__cellView[flat] == OBJECTIVE_CODE
+
+    # Returns the flat indices of the non-wall cells next to the given one,
+    # in the same order as getNeighbors
+    def getNeighborsFlat(self, flat):
+        cells = self.__cellView
+        neighbors = []
+        for stride, size in self.__axes:
+            idx = flat // stride % size
+            if idx + 1 < size and cells[flat + stride] != WALL_CODE:
+                neighbors.append(flat + stride)
+            if idx > 0 and cells[flat - stride] != WALL_CODE:
+                neighbors.append(flat - stride)
+        return neighbors
+
+    # Returns the cells as a flat uint8 array of character codes and the
+    # stride of every dimension within it
+    def getCells(self):
+        return self.__cells
+
+    def getStrides(self):
+        return self.__strides
+
+    # Returns the number of bytes held by the cells and by the fields and jump
+    # tables computed on them so far
+    def getMemoryUsage(self):
+        arrays = [self.__cells, self.__goalDistances, self.__components] + list(self.__jumpTables or [])
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def getChar(self, *angles):
+        return chr(self.__cellView[self.angleToFlat(angles)])
 
     # Returns True if the given position is the location of a wall
-    def isWall(self, alpha, beta):
-        return self.getChar(alpha, beta) == WALL_CHAR
+    def isWall(self, *angles):
+        return self.isWallFlat(self.angleToFlat(angles))
 
     # Rturns True if the given position is the location of an objective
-    def isObjective(self, alpha, beta):
-        return self.getChar(alpha, beta) == OBJECTIVE_CHAR
+    def isObjective(self, *angles):
+        return self.isObjectiveFlat(self.angleToFlat(angles))
 
-    # Returns the start position as a tuple of (beta, column)
+    # Returns the start position as a tuple of (alpha, beta, gamma)
     def getStart(self):
         return self.__start
 
     def setStart(self, start):
         self.__start = start
 
-    # Returns the dimensions of the maze as a (beta, column) tuple
+    # Returns the dimensions of the maze, one entry per angle
     def getDimensions(self):
         return self.__dimensions
 
-    # Returns the list of objective positions of the maze
+    # Returns the list of objective positions of the maze. The positions are
+    # tuples, so a copy of the list is enough to keep the maze unchanged.
     def getObjectives(self):
-        return copy.deepcopy(self.__objective)
+        return list(self.__objective)
 
     def setObjectives(self, objectives):
         self.__objective = objectives
+        self.__objectiveIndex = None
+
+    # Returns the objective positions as a set of tuples, for membership tests
+    def getObjectiveIndex(self):
+        if self.__objectiveIndex is None:
+            self.__objectiveIndex = set(map(tuple, self.getObjectives()))
+        return self.__objectiveIndex
 
-    # Check if the agent can move into a specific beta and column
-    def isValidMove(self, alpha, beta):
-        x, y = angleToIdx((alpha, beta), self.offsets, self.granularity)
-        return x >= 0 and x < self.getDimensions()[ALPHA] and \
-               y >= 0 and y < self.getDimensions()[BETA] and \
-               not self.isWall(alpha, beta)
+    # Check if the agent can move into a specific (alpha, beta, gamma)
+    def isValidMove(self, *angles):
+        flat = self.angleToFlat(angles)
+        return flat >= 0 and not self.isWallFlat(flat)
         
-    # Returns list of neighboing squares that can be moved to from the given beta,gamma
-    def getNeighbors(self, alpha, beta):
-        possibleNeighbors = [
-            (alpha + self.granularity, beta),
-            (alpha - self.granularity, beta),
-            (alpha, beta + self.granularity),
-            (alpha, beta - self.granularity)            
-        ]
-        neighbors = []
-        for a, b in possibleNeighbors:
-            if self.isValidMove(a,b):
-                neighbors.append((a,b))
-        return neighbors
+    # Returns list of neighboing squares that can be moved to from the given
+    # angles: one step up and down along every angle, 2*N candidates in total
+    def getNeighbors(self, *angles):
+        return [self.flatToAngle(flat) for flat in self.getNeighborsFlat(self.angleToFlat(angles))]
 
+    # Writes the maze with alpha along the columns and beta along the rows. A
+    # maze with a gamma angle is written as one such block per gamma value,
+    # separated by blank lines.
     def saveToFile(self, filename):        
-        outputMap = ""
-        for beta in range(self.__dimensions[1]):
-            for alpha in range(self.__dimensions[0]):
-                outputMap += self.__map[alpha][beta]
-            outputMap += "\n"
+        if len(self.__dimensions) == 1:
+            blocks = [self.__map[:, None]]
+        elif len(self.__dimensions) == 2:
+            blocks = [self.__map]
+        else:
+            blocks = [self.__map[:, :, gamma] for gamma in range(self.__dimensions[2])]
+
+        outputMap = "\n".join(
+            "".join(row.tobytes().decode() + "\n" for row in block.T) for block in blocks)
 
         with open(filename, 'w') as f:
             f.write(outputMap)
 
         return True
+
+    # Writes the maze in the binary format read by loadMaze: MAZE_FILE_MAGIC,
+    # the byte length of a JSON header as a little-endian uint32, the JSON
+    # header (dimensions, offsets, granularity, start, number of objectives),
+    # the flat indices of the objectives as little-endian int64, zero bytes
+    # up to a multiple of MAZE_FILE_ALIGNMENT, and then one byte per cell in
+    # row-major order. The cells are written in slices straight from the
+    # array, so a memory-mapped maze is never read in whole.
+    def saveToBinaryFile(self, filename):
+        objectives = np.array([self.angleToFlat(objective) for objective in self.getObjectives()], dtype='<i8')
+        header = json.dumps({
+            "version": MAZE_FILE_VERSION,
+            "dimensions": [int(size) for size in self.__dimensions],
+            "offsets": list(self.offsets),
+            "granularity": self.granularity,
+            "start": list(self.__start),
+            "objectives": len(objectives),
+        }).encode()
+        prefix = MAZE_FILE_MAGIC + np.array([len(header)], dtype='<u4').tobytes() + header + objectives.tobytes()
+        padding = -len(prefix) % MAZE_FILE_ALIGNMENT
+
+        with open(filename, 'wb') as f:
+            f.write(prefix + bytes(padding))
+            for start in range(0, len(self.__cells), MAZE_FILE_WRITE_SIZE):
+                f.write(memoryview(self.__cells[start:start + MAZE_FILE_WRITE_SIZE]))
+
+        return True
             
 
     def isValidPath(self, path):
@@ -111,21 +233,382 @@ class Maze:
         for i in range(1, len(path)):
             prev = path[i-1]
             cur = path[i]
-            dist = abs(prev[0]-cur[0]) + abs(prev[1]-cur[1])
+            dist = sum(abs(prev[j]-cur[j]) for j in range(len(cur)))
             if dist != self.granularity:
                 return "Not single hop"
 
         # Second, check whether it is valid move
         for pos in path:
-            if not self.isValidMove(pos[0], pos[1]):
+            if not self.isValidMove(*pos):
                 return "Not valid move"
 
 
         # Last, check whether it ends up at one of goals
-        if not path[-1] in self.__objective:
+        if not tuple(path[-1]) in self.getObjectiveIndex():
             return "Last position is not a goal state"
 
         return "Valid"
 
+    # Returns the character codes of an array of flat indices
+    def getCodesFlat(self, flats):
+        return self.__cells[flats]
+
+    # Checks many paths at once and returns the isValidPath message of every
+    # one of them. paths is a list of paths, each a sequence of angle tuples,
+    # or an array of shape (numPaths, maxLength, numAngles) together with the
+    # length of every path. The hops and cells of all paths are checked with
+    # array operations over their concatenated positions; an empty path is
+    # reported as not ending at a goal.
+    def validatePaths(self, paths, lengths=None):
+        numAngles = len(self.__dimensions)
+        if lengths is None:
+            lengths = np.array([len(path) for path in paths], dtype=np.int64)
+            points = np.array(list(chain.from_iterable(paths)), dtype=np.float64).reshape(-1, numAngles)
+        else:
+            lengths = np.asarray(lengths, dtype=np.int64)
+            paths = np.asarray(paths, dtype=np.float64)
+            points = paths[np.arange(paths.shape[1]) < lengths[:, None]]
+        owner = np.repeat(np.arange(len(lengths)), lengths)
+
+        # First, single hops between consecutive positions of the same path
+        hops = np.abs(np.diff(points, axis=0)).sum(axis=1) != self.granularity
+        notSingleHop = np.zeros(len(lengths), dtype=bool)
+        notSingleHop[owner[:-1][hops & (owner[:-1] == owner[1:])]] = True
+
+        # Second, every position inside the maze and off the walls
+        idx = np.trunc((points - np.asarray(self.offsets, dtype=np.float64)) / self.granularity).astype(np.int64)
+        inside = ((idx >= 0) & (idx < np.asarray(self.__dimensions))).all(axis=1)
+        badMove = ~inside
+        badMove[inside] = self.getCodesFlat(idx[inside] @ np.asarray(self.__strides, dtype=np.int64)) == WALL_CODE
+        notValidMove = np.zeros(len(lengths), dtype=bool)
+        notValidMove[owner[badMove]] = True
+
+        # Last, the final position among the objectives
+        index = self.getObjectiveIndex()
+        ends = np.cumsum(lengths) - 1
+        atGoal = [length > 0 and tuple(points[end].tolist()) in index for end, length in zip(ends, lengths)]
+
+        return ["Not single hop" if notSingleHop[i] else
+                "Not valid move" if notValidMove[i] else
+                "Valid" if atGoal[i] else
+                "Last position is not a goal state" for i in range(len(lengths))]
+
+    # Computes, for answering many start queries against this maze, the
+    # number of steps from every cell to the nearest objective (-1 for walls
+    # and cells that cannot reach one) and a label per connected region of
+    # free cells (-1 for walls). Both are breadth-first sweeps in which a
+    # whole frontier of flat indices is expanded with NumPy at once.
+    def computeGoalField(self):
+        free = self.__cells != WALL_CODE
+        distances = np.full(len(self.__cells), -1, dtype=np.int32)
+        frontier = np.nonzero(self.__cells == OBJECTIVE_CODE)[0]
+        distances[frontier] = 0
+        # slots drops the repeats of a frontier: of the copies of a cell,
+        # only the one whose position was written last matches it
+        slots = np.empty(len(self.__cells), dtype=np.int64)
+        depth = 0
+        while len(frontier):
+            depth += 1
+            frontier = self.__neighborsOf(frontier)
+            frontier = frontier[free[frontier] & (distances[frontier] < 0)]
+            distances[frontier] = depth
+            order = np.arange(len(frontier))
+            slots[frontier] = order
+            frontier = frontier[slots[frontier] == order]
+
+        # Connected regions, over the free cells only: hook the root of one
+        # end of every edge onto the smaller root of the other end, then
+        # flatten the trees, until both ends of every edge share a root.
+        freeFlats = np.nonzero(free)[0]
+        numbering = np.cumsum(free) - 1
+        edges = []
+        for stride, size in self.__axes:
+            low = freeFlats[freeFlats // stride % size + 1 < size]
+            low = low[free[low + stride]]
+            edges.append(np.stack([numbering[low], numbering[low + stride]]))
+        first, second = np.concatenate(edges, axis=1)
+        roots = np.arange(len(freeFlats), dtype=np.int32)
+        while True:
+            a, b = roots[first], roots[second]
+            apart = a != b
+            if not apart.any():
+                break
+            first, second, a, b = first[apart], second[apart], a[apart], b[apart]
+            np.minimum.at(roots, np.maximum(a, b), np.minimum(a, b))
+            while True:
+                jumped = roots[roots]
+                if np.array_equal(jumped, roots):
+                    break
+                roots = jumped
+        components = np.full(len(self.__cells), -1, dtype=np.int32)
+        components[freeFlats] = roots
+
+        # The fields are stored finished and goal distances last, since their
+        # getters only compute them while they are None and searches on other
+        # threads may look at them meanwhile
+        self.__components = components
+        self.__goalDistanceView = memoryview(distances)
+        self.__goalDistances = distances
+
+    # Returns the flat indices next to the given ones, walls and repeats included
+    def __neighborsOf(self, flats):
+        neighbors = []
+        for stride, size in self.__axes:
+            idx = flats // stride % size
+            neighbors.append(flats[idx + 1 < size] + stride)
+            neighbors.append(flats[idx > 0] - stride)
+        return np.concatenate(neighbors)
+
+    # Computes the jump tables used by jump point search. Moves are numbered
+    # 2 * axis for a step up along an angle and 2 * axis + 1 for a step down.
+    # Table d holds, for every cell, the number of steps of move d to the
+    # first cell where a jump in that direction has to stop, or 0 if a wall
+    # or the edge of the maze comes first. A jump along an axis stops at
+    # objectives, at cells where a higher axis has a forced neighbor (the
+    # cell next to it is free while the one next to the previous cell is a
+    # wall), and at cells from which a jump along a lower axis stops.
+    def computeJumpTables(self):
+        free = self.__map != WALL_CODE
+        objective = self.__map == OBJECTIVE_CODE
+        numAxes = len(self.__dimensions)
+
+        def shifted(a, axis, step):
+            # shifted(a, axis, step)[q] == a[q + step along axis], False outside
+            out = np.zeros_like(a)
+            src = [slice(None)] * a.ndim
+            dst = [slice(None)] * a.ndim
+            src[axis] = slice(step, None) if step > 0 else slice(None, step)
+            dst[axis] = slice(None, -step) if step > 0 else slice(-step, None)
+            out[tuple(dst)] = a[tuple(src)]
+            return out
+
+        tables = []
+        for axis in range(numAxes):
+            for step in (1, -1):
+                stop = objective.copy()
+                behind = shifted(free, axis, -step)
+                for higher in range(axis + 1, numAxes):
+                    for turn in (1, -1):
+                        stop |= shifted(free, higher, turn) & ~shifted(behind, higher, turn)
+                for lower in tables[:2 * axis]:
+                    stop |= lower > 0
+                stop &= free
+
+                jumps = np.zeros(self.__dimensions, dtype=np.int16)
+                sweepJumps, sweepStop, sweepFree = (np.moveaxis(a, axis, 0) for a in (jumps, stop, free))
+                order = range(sweepJumps.shape[0] - 2, -1, -1) if step > 0 else range(1, sweepJumps.shape[0])
+                for i in order:
+                    nxt = i + step
+                    sweepJumps[i] = np.where(sweepStop[nxt], 1,
+                                             np.where(sweepFree[nxt] & (sweepJumps[nxt] > 0), sweepJumps[nxt] + 1, 0))
+                tables.append(jumps)
+        self.__jumpTables = [memoryview(table.reshape(-1)) for table in tables]
+
+    # Returns the jump tables of computeJumpTables as flat memoryviews
+    def getJumpTables(self):
+        if self.__jumpTables is None:
+            self.computeJumpTables()
+        return self.__jumpTables
+
+    # Returns the number of steps from the given angles to the nearest
+    # objective, or -1 if none can be reached
+    def getGoalDistance(self, *angles):
+        if self.__goalDistances is None:
+            self.computeGoalField()
+        flat = self.angleToFlat(angles)
+        return -1 if flat < 0 else self.__goalDistanceView[flat]
+
+    # Returns the label of the free region holding the given angles, or -1
+    # for walls; two positions are connected iff their labels are equal
+    def getComponent(self, *angles):
+        if self.__components is None:
+            self.computeGoalField()
+        flat = self.angleToFlat(angles)
+        return -1 if flat < 0 else int(self.__components[flat])
+
+    # Returns a shortest path from the given angles to an objective by walking
+    # down the goal distances, or [] if no objective can be reached
+    def getPathFrom(self, start):
+        if self.__goalDistances is None:
+            self.computeGoalField()
+        distances = self.__goalDistanceView
+        flat = self.angleToFlat(start)
+        if flat < 0 or distances[flat] < 0:
+            return []
+        path = [self.flatToAngle(flat)]
+        while distances[flat] > 0:
+            flat = next(n for n in self.getNeighborsFlat(flat) if distances[n] == distances[flat] - 1)
+            path.append(self.flatToAngle(flat))
+        return path
+
+    # Returns the maze as nested lists of characters
     def get_map(self):
-        return self.__map
+        return self.__map.astype(np.uint32).view('<U1').tolist()
+
+
+class LazyMaze(Maze):
+    # A maze whose cells are only classified when they are first looked at.
+    #
+    # classify(flats) returns the character codes of the given flat indices
+    # and is called for one tile of LAZY_TILE_SIZE cells per angle at a time,
+    # so that nearby cells touched later by a search are already known.
+    # findObjectives() returns the flat indices of all objective cells; it is
+    # only called when the objective list is needed (e.g. by A* or
+    # isValidPath), since plain bfs just tests the cells it reaches.
+    def __init__(self, dimensions, offsets, granularity, start, classify, findObjectives):
+        self.offsets = offsets
+        self.granularity = granularity
+        self.setCells(np.full(dimensions, UNKNOWN_CODE, dtype=np.uint8))
+        self.__dimensions = tuple(dimensions)
+        self.__cellView = memoryview(self.getCells())
+        self.__axes = tuple(zip(self.getStrides(), dimensions))
+        self.__classify = classify
+        self.__findObjectives = findObjectives
+        self.__objective = None
+
+        flat = self.angleToFlat(start)
+        if flat < 0 or classify(np.array([flat]))[0] != SPACE_CODE:
+            print("Maze has no start")
+            raise SystemExit
+        self.__cellView[flat] = START_CODE
+        self.setStart(self.flatToAngle(flat))
+
+    # Classifies the not yet known cells of the tile holding the given flat
+    # index and returns the code of that cell
+    def classifyTile(self, flat):
+        corner = [i // LAZY_TILE_SIZE * LAZY_TILE_SIZE for i in np.unravel_index(flat, self.__dimensions)]
+        ranges = [np.arange(c, min(c + LAZY_TILE_SIZE, size)) for c, size in zip(corner, self.__dimensions)]
+        flats = np.ravel_multi_index(np.meshgrid(*ranges, indexing='ij'), self.__dimensions).ravel()
+        cells = self.getCells()
+        flats = flats[cells[flats] == UNKNOWN_CODE]
+        cells[flats] = self.__classify(flats)
+        return self.__cellView[flat]
+
+    # Classifies every cell that is not known yet
+    def classifyAll(self):
+        cells = self.getCells()
+        unknown = np.nonzero(cells == UNKNOWN_CODE)[0]
+        for start in range(0, len(unknown), CELL_CHUNK_SIZE):
+            flats = unknown[start:start + CELL_CHUNK_SIZE]
+            cells[flats] = self.__classify(flats)
+
+    def getCodeFlat(self, flat):
+        code = self.__cellView[flat]
+        return code if code != UNKNOWN_CODE else self.classifyTile(flat)
+
+    def isWallFlat(self, flat):
+        return self.getCodeFlat(flat) == WALL_CODE
+
+    def isObjectiveFlat(self, flat):
+        return self.getCodeFlat(flat) == OBJECTIVE_CODE
+
+    def getNeighborsFlat(self, flat):
+        cells = self.__cellView
+        neighbors = []
+        for stride, size in self.__axes:
+            idx = flat // stride % size
+            if idx + 1 < size:
+                code = cells[flat + stride]
+                if code == UNKNOWN_CODE:
+                    code = self.classifyTile(flat + stride)
+                if code != WALL_CODE:
+                    neighbors.append(flat + stride)
+            if idx > 0:
+                code = cells[flat - stride]
+                if code == UNKNOWN_CODE:
+                    code = self.classifyTile(flat - stride)
+                if code != WALL_CODE:
+                    neighbors.append(flat - stride)
+        return neighbors
+
+    def getChar(self, *angles):
+        return chr(self.getCodeFlat(self.angleToFlat(angles)))
+
+    def getObjectives(self):
+        if self.__objective is None:
+            flats = self.__findObjectives()
+            self.getCells()[flats] = OBJECTIVE_CODE
+            self.__objective = [self.flatToAngle(flat) for flat in flats.tolist()]
+        return list(self.__objective)
+
+    def setObjectives(self, objectives):
+        self.__objective = objectives
+        Maze.setObjectives(self, objectives)
+
+    def getCodesFlat(self, flats):
+        cells = self.getCells()
+        unknown = np.unique(flats[cells[flats] == UNKNOWN_CODE])
+        if len(unknown):
+            cells[unknown] = self.__classify(unknown)
+        return cells[flats]
+
+    def saveToFile(self, filename):
+        self.classifyAll()
+        return Maze.saveToFile(self, filename)
+
+    def saveToBinaryFile(self, filename):
+        self.classifyAll()
+        return Maze.saveToBinaryFile(self, filename)
+
+    def computeGoalField(self):
+        self.classifyAll()
+        Maze.computeGoalField(self)
+
+    def computeJumpTables(self):
+        self.classifyAll()
+        Maze.computeJumpTables(self)
+
+    def get_map(self):
+        self.classifyAll()
+        return Maze.get_map(self)
+
+
+def loadMaze(filename, offsets=None, granularity=None):
+    """This function reads a maze written by Maze.saveToBinaryFile or Maze.saveToFile
+
+        The cells of a binary maze file are memory-mapped copy-on-write: the
+        file is only read as cells are looked at, processes opening the same
+        file share its pages, and changes to the maze never reach the file.
+        A text maze file holds neither offsets nor granularity, so both must
+        be given to read one.
+
+        Args:
+            filename (str): path of the maze file
+            offsets (tuple): lowest angle of every arm link, for text files
+            granularity (int): degrees between neighboring cells, for text files
+
+        Return:
+            Maze: the maze stored in the file
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(MAZE_FILE_MAGIC)) != MAZE_FILE_MAGIC:
+            f.seek(0)
+            return readTextMaze(f.read().decode(), offsets, granularity)
+        headerLength = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+        header = json.loads(f.read(headerLength).decode())
+        if header["version"] != MAZE_FILE_VERSION:
+            raise ValueError("%s: unsupported maze file version %s" % (filename, header["version"]))
+        flats = np.frombuffer(f.read(8 * header["objectives"]), dtype='<i8')
+        payloadOffset = f.tell() + (-f.tell() % MAZE_FILE_ALIGNMENT)
+
+    dims = tuple(header["dimensions"])
+    offsets = tuple(header["offsets"])
+    granularity = header["granularity"]
+    cells = np.memmap(filename, dtype=np.uint8, mode='c', offset=payloadOffset, shape=dims)
+    idx = np.unravel_index(flats, dims)
+    angles = np.stack([i * granularity + offset for i, offset in zip(idx, offsets)], axis=1).tolist()
+    return Maze(cells, offsets, granularity, tuple(header["start"]), [tuple(angle) for angle in angles])
+
+
+def readTextMaze(text, offsets, granularity):
+    """This function returns the Maze of the text written by Maze.saveToFile:
+       alpha along the columns, beta along the rows and one block per gamma
+    """
+    if offsets is None or granularity is None:
+        raise ValueError("offsets and granularity are needed to read a text maze")
+    blocks = [block.split("\n") for block in text.rstrip("\n").split("\n\n")]
+    grid = np.array([[list(row) for row in block] for block in blocks], dtype='<U1')
+    # (gamma, beta, alpha) -> (alpha, beta, gamma), keeping only the angles the arm has
+    grid = grid.transpose(2, 1, 0)
+    grid = grid.reshape(grid.shape[:len(offsets)])
+    return Maze(grid, offsets, granularity)
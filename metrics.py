@@ -0,0 +1,100 @@
+# metrics.py
+# ---------------
+# Licensing Information:  You are free to use or extend this projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to the University of Illinois at Urbana-Champaign
+
+"""
+This file contains the counters, phase timers and profiling hooks used to
+inspect planning runs.
+
+Everything is off until enable() is called. Callers in hot paths check
+metrics.enabled before computing what they would count, and count whole
+batches at a time, so a disabled run pays nothing for the instrumentation.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+enabled = False
+counters = {}
+timers = {}
+
+_profiler = None
+_profile = {}
+
+def enable(profile=False):
+    """This function turns instrumentation on. With profile=True, the run is also
+       profiled with cProfile and its memory traced with tracemalloc until report()
+    """
+    global enabled, _profiler
+    enabled = True
+    if profile and _profiler is None:
+        _profiler = cProfile.Profile()
+        tracemalloc.start()
+        _profiler.enable()
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    """This function clears all counters, timers and profiling results
+    """
+    counters.clear()
+    timers.clear()
+    _profile.clear()
+
+def count(name, n=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+@contextmanager
+def timer(name):
+    """Context manager adding the wall time of its block to the timer name
+    """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timers[name] = timers.get(name, 0.0) + time.perf_counter() - start
+
+def stopProfiling(limit=25):
+    """This function stops a profile started by enable(profile=True) and keeps
+       the top functions by cumulative time and the peak traced memory
+    """
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.disable()
+    stream = io.StringIO()
+    pstats.Stats(_profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    _profile['cumulative'] = stream.getvalue()
+    _profile['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    _profiler = None
+
+def report():
+    """This function returns the counters, timers (in seconds) and profiling
+       results collected so far as a dict
+    """
+    stopProfiling()
+    result = {'counters': dict(counters), 'timers': dict(timers)}
+    if _profile:
+        result['profile'] = dict(_profile)
+    return result
+
+def writeReport(filename):
+    """This function writes report() to the given file as JSON
+    """
+    with open(filename, 'w') as f:
+        json.dump(report(), f, indent=2)
@@ -11,59 +11,73 @@
 This file contains the main application that is run for this MP.
 """
 
+import os
 import pygame
 import sys
 import argparse
 import configparser
-import copy
+import metrics
 
 from pygame.locals import *
 from arm import Arm
-from transform import transformToMaze
+from transform import transformToMaze, transformToLazyMaze, transformToMazeCached, transformToMazeMultires, transformToGrid, getMazeDimensions
+from maze import loadMaze
 from search import search
 from const import *
 from util import *
 from geometry import *
+from spatial import indexCircles
 
 class Application:
 
-    def __init__(self, configfile, map_name, human=True, fps=DEFAULT_FPS):
+    def __init__(self, configfile, map_name, human=True, fps=DEFAULT_FPS, offscreen=False):
         self.running = False
         self.displaySurface = None
+        self.trajectorySurface = None
+        self.offscreen = offscreen
         self.config = configparser.ConfigParser()
         self.config.read(configfile)
         self.fps = fps
         self.__human = human
         self.clock = pygame.time.Clock()   
         self.trajectory = []   
+        self.occupancy = None
 
         # Parse config file
-        self.windowTitle = "CS440 MP2 Robotic Arm"
-        self.window = eval(self.config.get(map_name, 'Window'))
+        with metrics.timer('parse'):
+            self.windowTitle = "CS440 MP2 Robotic Arm"
+            self.window = eval(self.config.get(map_name, 'Window'))
 
-        armBase = eval(self.config.get(map_name, 'ArmBase'))
-        armLinks = eval(self.config.get(map_name, 'ArmLinks'))
-        self.armLimits = [(0, 0), (0, 0), (0, 0)]
-        for i in range(len(armLinks)):
-            self.armLimits[i] = armLinks[i][-1]
-        self.arm = Arm(armBase, armLinks)
+            armBase = eval(self.config.get(map_name, 'ArmBase'))
+            armLinks = eval(self.config.get(map_name, 'ArmLinks'))
+            self.armLimits = [(0, 0), (0, 0), (0, 0)]
+            for i in range(len(armLinks)):
+                self.armLimits[i] = armLinks[i][-1]
+            self.arm = Arm(armBase, armLinks)
 
-        self.obstacles = eval(self.config.get(map_name, 'Obstacles'))
-        self.goals = eval(self.config.get(map_name, 'Goals'))
+            self.obstacles = eval(self.config.get(map_name, 'Obstacles'))
+            self.goals = eval(self.config.get(map_name, 'Goals'))
 
 
     # Initializes the pygame context and certain properties of the maze
     def initialize(self):
         
+        if self.offscreen:
+            # Nothing is shown, so let SDL render without a video device
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
         pygame.init()
         self.displaySurface = pygame.display.set_mode((self.window[0], self.window[1]), pygame.HWSURFACE)
         self.displaySurface.fill(WHITE)
         pygame.display.flip()
         pygame.display.set_caption(self.windowTitle)
+        self.trajectorySurface = pygame.Surface((self.window[0], self.window[1]))
+        self.trajectorySurface.fill(WHITE)
+        self.trajectorySurface.set_colorkey(WHITE)
         self.running = True
 
     # Once the application is initiated, execute is in charge of drawing the game and dealing with the game loop
-    def execute(self, searchMethod, granularity, trajectory, saveImage, saveMaze):        
+    def execute(self, searchMethod, granularity, trajectory, saveImage, saveMaze, lazy=False, mazeCache=None, workers=1,
+                multires=False, mazeFile=None):        
         self.initialize()
         if not self.running:
             print("Program init failed")
@@ -76,23 +90,53 @@ class Application:
 
         if not self.__human:
             print("Transforming a map configuration to a maze...")
-            maze = transformToMaze(self.arm, self.goals, self.obstacles, self.window, granularity)
+            with metrics.timer('transform'):
+                if mazeFile:
+                    maze = loadMaze(mazeFile, tuple(limit[0] for limit in self.arm.getArmLimit()), granularity)
+                elif lazy:
+                    maze = transformToLazyMaze(self.arm, self.goals, self.obstacles, self.window, granularity)
+                elif mazeCache:
+                    maze = transformToMazeCached(self.arm, self.goals, self.obstacles, self.window, granularity, mazeCache, workers)
+                elif multires:
+                    maze = transformToMazeMultires(self.arm, self.goals, self.obstacles, self.window, granularity)
+                else:
+                    maze = transformToMaze(self.arm, self.goals, self.obstacles, self.window, granularity, workers)
             print("Done!")
             print("Searching the path...")
-            path = search(maze, searchMethod)
+            with metrics.timer('search'):
+                path = search(maze, searchMethod)
             if path is None:
                 print("No path found!")
             else:
-                for i in range(len(path)):
-                    self.arm.setArmAngle(path[i])
-                    if (trajectory > 0) and (i % trajectory == 0):
-                        self.trajectory.append(self.arm.getArmPos())
-                    self.gameLoop()
+                with metrics.timer('render'):
+                    # Footprints are shaded by their position in the whole
+                    # trajectory, so count them before drawing any
+                    numFootprints = len(range(0, len(path), trajectory)) if trajectory > 0 else 0
+                    for i in range(len(path)):
+                        self.arm.setArmAngle(path[i])
+                        if (trajectory > 0) and (i % trajectory == 0):
+                            self.addFootprint(self.arm.getArmPos(), numFootprints)
+                        if not self.offscreen:
+                            self.gameLoop()
+                    if self.offscreen:
+                        self.gameLoop()
+                    self.drawTrajectory()
                 print("Done!")
-                self.drawTrajectory()
 
-        while self.running:
-            pygame.event.pump()            
+        if self.__human:
+            with metrics.timer('transform'):
+                self.buildOccupancy(granularity, mazeCache, workers, mazeFile)
+            # Held keys come back as repeated KEYDOWN events at the frame rate
+            interval = max(1, 1000 // self.fps)
+            pygame.key.set_repeat(interval, interval)
+
+        while self.running and not self.offscreen:
+            # Sleep until there is something to do instead of polling the keys
+            event = pygame.event.wait()
+            if event.type == QUIT:
+                self.running = False
+            if event.type != KEYDOWN:
+                continue
             keys = pygame.key.get_pressed()
                         
             if (keys[K_ESCAPE]):
@@ -119,27 +163,18 @@ class Application:
                     gamma -= granularity if isValueInBetween(self.armLimits[GAMMA], gamma-granularity) else 0
 
                 newAngle = (alpha, beta, gamma)                
-                tempArm = copy.deepcopy(self.arm)
-                tempArm.setArmAngle(newAngle)
-                armEnd = tempArm.getEnd()
-                armPos = tempArm.getArmPos()
-                armPosDist = tempArm.getArmPosDist()
-
-                print("doesArmTouchObjects", doesArmTouchObjects(armPosDist, self.obstacles))
-
-                # print(armPosDist)
-                
-                if doesArmTouchObjects(armPosDist, self.obstacles) or not isArmWithinWindow(armPos, self.window):
+                if newAngle == tuple(currAngle):
                     continue
 
-                if not doesArmTipTouchGoals(armEnd, self.goals) and doesArmTouchObjects(armPosDist, self.goals, isGoal=True):
+                allowed, reachesGoal = self.checkMove(newAngle)
+                if not allowed:
                     continue
                 
                 self.arm.setArmAngle(newAngle)
                 self.gameLoop()
-                currAngle = copy.deepcopy(newAngle)
+                currAngle = newAngle
 
-                if doesArmTipTouchGoals(armEnd, self.goals):
+                if reachesGoal:
                     self.gameLoop()
                     print("SUCCESS")
                     raise SystemExit
@@ -149,11 +184,80 @@ class Application:
             pygame.image.save(self.displaySurface, saveImage)
 
         if saveMaze and not self.__human:
-            maze.saveToFile(saveMaze)
+            if saveMaze.endswith(BINARY_MAZE_SUFFIX):
+                maze.saveToBinaryFile(saveMaze)
+            else:
+                maze.saveToFile(saveMaze)
             
 
+    def buildOccupancy(self, granularity, mazeCache=None, workers=1, mazeFile=None):
+        """This function classifies the configuration space once for human mode,
+           so that checkMove is a grid lookup. The grid is only usable when the
+           start angles lie on the lattice of the maze; moves keep them there.
+        """
+        limits = self.arm.getArmLimit()
+        offsets = [limit[0] for limit in limits]
+        self.obstacleIndex = indexCircles(self.obstacles, self.window)
+        self.goalIndex = indexCircles(self.goals, self.window)
+        if any((angle - offset) % granularity for angle, offset in zip(self.arm.getArmAngle(), offsets)):
+            self.occupancy = None
+            return
+        try:
+            if mazeFile:
+                maze = loadMaze(mazeFile, tuple(offsets), granularity)
+            elif mazeCache:
+                maze = transformToMazeCached(self.arm, self.goals, self.obstacles, self.window, granularity, mazeCache, workers)
+            else:
+                maze = None
+        except SystemExit:
+            # Maps without a free start or an objective make no maze, but
+            # can still be played
+            maze = None
+        # A maze file made for other arm limits or another granularity does
+        # not describe these moves
+        if maze is not None and (tuple(maze.getDimensions()) != getMazeDimensions(limits, granularity)
+                                 or tuple(maze.offsets) != tuple(offsets) or maze.granularity != granularity):
+            maze = None
+        if maze is not None:
+            self.occupancy = maze.getCells().reshape(maze.getDimensions())
+            self.occupancyOffsets = maze.offsets
+            self.occupancyGranularity = maze.granularity
+        else:
+            self.occupancy = transformToGrid(self.arm, self.goals, self.obstacles, self.window, granularity, workers)
+            self.occupancyOffsets = offsets
+            self.occupancyGranularity = granularity
+
+
+    def checkMove(self, angles):
+        """This function returns (allowed, reachesGoal) for moving the arm to the
+           given angles: moves that touch an obstacle, leave the window, or
+           touch a goal with anything but the tip are not allowed
+        """
+        numLinks = self.arm.getNumArmLinks()
+        if self.occupancy is not None:
+            code = self.occupancy[angleToIdx(angles[:numLinks], self.occupancyOffsets, self.occupancyGranularity)]
+            if code == WALL_CODE:
+                return False, False
+            if code != OBJECTIVE_CODE:
+                return True, False
+            # The maze marks a tip in a goal before testing the obstacles, so
+            # only those cells need the arm itself
+
+        joints = self.arm.kinematics(angles)
+        armEnd = joints[-1]
+        armPos = list(zip(joints[:-1], joints[1:]))
+        armPosDist = [(start, end, distance) for (start, end), distance in zip(armPos, self.arm.getArmDistances())]
+
+        if doesArmTouchObjects(armPosDist, self.obstacleIndex) or not isArmWithinWindow(armPos, self.window):
+            return False, False
+        if doesArmTipTouchGoals(armEnd, self.goalIndex):
+            return True, True
+        return not doesArmTouchObjects(armPosDist, self.goalIndex, isGoal=True), False
+
+
     def gameLoop(self):
-        self.clock.tick(self.fps)
+        if not self.offscreen:
+            self.clock.tick(self.fps)
         self.displaySurface.fill(WHITE)
         self.drawTrajectory()
         self.drawArm()
@@ -162,14 +266,23 @@ class Application:
         pygame.display.flip()
       
 
+    def addFootprint(self, armPos, numFootprints):
+        """This function draws the arm position onto the cached trajectory surface
+
+            Args:
+                armPos (list): start and end positions of all arm links [(start, end)]
+                numFootprints (int): number of footprints the whole trajectory will have
+        """
+        self.trajectory.append(armPos)
+        x = (255 - 255/numFootprints*len(self.trajectory))
+        color = (x, x, x)
+        for i in range(len(armPos)):
+            pygame.draw.line(self.trajectorySurface, color, armPos[i][0], armPos[i][1], ARM_LINKS_WIDTH[i])
+
+
     def drawTrajectory(self):
-        cnt = 1
-        for armPos in self.trajectory:
-            x = (255 - 255/len(self.trajectory)*cnt)
-            color = (x, x, x)
-            cnt += 1
-            for i in range(len(armPos)):
-                pygame.draw.line(self.displaySurface, color, armPos[i][0], armPos[i][1], ARM_LINKS_WIDTH[i])  
+        # White is the colorkey of the cached surface, so only footprints are copied
+        self.displaySurface.blit(self.trajectorySurface, (0, 0))
 
 
     def drawArm(self):
@@ -198,7 +311,7 @@ if __name__ == "__main__":
     parser.add_argument('--map', dest="map_name", type=str, default = "BasicMap",
                         help='configuration filename - default BasicMap')
     parser.add_argument('--method', dest="search", type=str, default = "bfs", 
-                        choices = ["bfs"],
+                        choices = ["bfs", "bibfs", "field", "jps", "astar", "wastar", "prm", "rrt"],
                         help='search method - default bfs')
     parser.add_argument('--human', default = False, action = "store_true",
                         help='flag for human playable - default False')
@@ -210,9 +323,46 @@ if __name__ == "__main__":
                         help='leave footprint of rotation trajectory in every x moves - default 0')
     parser.add_argument('--save-image', dest="saveImage", type=str, default = None, 
                         help='save output to image file - default not saved')
+    parser.add_argument('--offscreen', default = False, action = "store_true",
+                        help='render without a window and as fast as possible, use with --save-image - default False')
     parser.add_argument('--save-maze', dest="saveMaze", type=str, default = None, 
-                        help='save the contructed maze to maze file - default not saved')
+                        help='save the contructed maze to maze file, in the binary format if it ends with '+BINARY_MAZE_SUFFIX+' - default not saved')
+    parser.add_argument('--load-maze', dest="mazeFile", type=str, default = None,
+                        help='read the maze from a file written by --save-maze instead of constructing it - default constructed')
+    parser.add_argument('--lazy', default = False, action = "store_true",
+                        help='classify maze cells only when the search reaches them - default False')
+    parser.add_argument('--maze-cache', dest="mazeCache", type=str, default = None,
+                        help='directory to keep constructed mazes in and reuse them from - default not cached')
+    parser.add_argument('--multires', default = False, action = "store_true",
+                        help='build the maze coarse to fine, only refining blocks near obstacle boundaries - default False')
+    parser.add_argument('--workers', dest="workers", type=int, default = 1,
+                        help='number of processes used to construct the maze - default 1')
+    parser.add_argument('--metrics', dest="metricsFile", type=str, default = None,
+                        help='write counters and phase timings of the run to a JSON file - default not written')
+    parser.add_argument('--profile', default = False, action = "store_true",
+                        help='include a cProfile summary and peak traced memory in the --metrics report - default False')
     
     args = parser.parse_args()
-    app = Application(args.configfile, args.map_name, args.human, args.fps)
-    app.execute(args.search, args.granularity, args.trajectory, args.saveImage, args.saveMaze)
\ No newline at end of file
+    if args.offscreen and args.human:
+        parser.error("--offscreen cannot be used with --human")
+    if args.profile and not args.metricsFile:
+        parser.error("--profile needs --metrics to write the profile to")
+    # The maze comes from one source, and only full transforms run on workers
+    sources = [flag for flag, given in [("--load-maze", args.mazeFile), ("--lazy", args.lazy),
+                                        ("--maze-cache", args.mazeCache), ("--multires", args.multires)] if given]
+    if len(sources) > 1:
+        parser.error("%s cannot be used together" % " and ".join(sources))
+    if args.workers > 1 and (args.mazeFile or args.lazy or args.multires):
+        parser.error("--workers cannot be used with %s" % sources[0])
+    if args.human and (args.lazy or args.multires):
+        parser.error("%s cannot be used with --human" % sources[0])
+    if args.metricsFile:
+        metrics.enable(profile=args.profile)
+    app = Application(args.configfile, args.map_name, args.human, args.fps, args.offscreen)
+    try:
+        app.execute(args.search, args.granularity, args.trajectory, args.saveImage, args.saveMaze, args.lazy, args.mazeCache, args.workers,
+                    args.multires, args.mazeFile)
+    finally:
+        # Human runs end by closing the window or by SystemExit on reaching a goal
+        if args.metricsFile:
+            metrics.writeReport(args.metricsFile)
\ No newline at end of file
@@ -0,0 +1,483 @@
+# sampling.py
+# ---------------
+# Licensing Information:  You are free to use or extend this projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to the University of Illinois at Urbana-Champaign
+
+"""
+This file contains the sampling-based planners: a probabilistic roadmap (PRM)
+that is kept with a maze and reused by later queries, and RRT-Connect for
+single queries.
+
+Both draw joint angles from the continuous ranges of the arm and round them
+to the nearest cell of the maze. An edge between two cells is the staircase
+of single steps that follows the straight segment between them, and it is
+free when none of its cells is a wall. Cells are looked up with
+Maze.getCodesFlat, so on a LazyMaze only the cells along the tried edges are
+ever classified, and the paths returned are lattice paths for isValidPath.
+"""
+
+import threading
+import time
+import weakref
+import numpy as np
+import metrics
+import search
+from heapq import heappop, heappush
+from const import *
+
+
+def latticeSegments(starts, ends):
+    """This function returns the staircases from every start cell to the matching
+       end cell. Each moves one angle by one cell at a time, in the order in
+       which the straight segment between the two cells crosses cell borders.
+
+        Args:
+            starts (ndarray): (numEdges, numAngles) cell indices
+            ends (ndarray): (numEdges, numAngles) cell indices
+
+        Return:
+            (cells, firsts): (numSteps, numAngles) cells of all staircases, start
+            excluded and end included, and the row where each staircase begins
+    """
+    delta = ends - starts
+    counts = np.abs(delta)
+    numEdges, numAngles = delta.shape
+    perAxis = counts.reshape(-1)
+    lengths = counts.sum(axis=1)
+    firsts = np.cumsum(lengths) - lengths
+
+    # One event per step: its edge, its angle and how far along the segment it is
+    edges = np.repeat(np.repeat(np.arange(numEdges), numAngles), perAxis)
+    axes = np.repeat(np.tile(np.arange(numAngles), numEdges), perAxis)
+    k = np.arange(len(edges)) - np.repeat(np.cumsum(perAxis) - perAxis, perAxis)
+    t = (k + 0.5) / np.repeat(perAxis, perAxis)
+    order = np.lexsort((axes, t, edges))
+    edges, axes = edges[order], axes[order]
+
+    steps = np.zeros((len(edges), numAngles), dtype=np.int64)
+    steps[np.arange(len(edges)), axes] = np.sign(delta)[edges, axes]
+    cells = np.cumsum(steps, axis=0)
+    # Restart the running sum at the first step of every edge
+    before = np.zeros((numEdges, numAngles), dtype=np.int64)
+    later = firsts > 0
+    before[later] = cells[firsts[later] - 1]
+    cells += np.repeat(starts - before, lengths, axis=0)
+    return cells, firsts
+
+
+class Lattice:
+    """The cells of a maze as points to sample, measure and connect
+    """
+    def __init__(self, maze, rng):
+        self.maze = maze
+        self.rng = rng
+        self.dims = np.array(maze.getDimensions(), dtype=np.int64)
+        self.strides = np.array(maze.getStrides(), dtype=np.int64)
+        self.offsets = np.array(maze.offsets[:len(self.dims)])
+        self.granularity = maze.granularity
+        # Longest edge, in cells
+        self.maxEdge = max(1.0, SAMPLING_MAX_EDGE_DEGREES / maze.granularity)
+
+    def sample(self, count):
+        """This function returns the cells of count uniformly drawn joint angles
+        """
+        if metrics.enabled:
+            metrics.count('samples_drawn', count)
+        angles = self.rng.random((count, len(self.dims))) * (self.dims - 1) * self.granularity
+        return np.rint(angles / self.granularity).astype(np.int64)
+
+    def sampleObjectives(self, count):
+        """This function returns up to count objective cells found among
+           SAMPLING_GOAL_SAMPLES samples (fewer for small mazes), or picked from the objective list of
+           the maze if no sample is one. Listing the objectives of a LazyMaze
+           computes the tip position of every cell, which sampling avoids.
+        """
+        found = np.empty((0, len(self.dims)), dtype=np.int64)
+        budget = min(SAMPLING_GOAL_SAMPLES, int(np.prod(self.dims)))
+        drawn = 0
+        while drawn < budget and len(found) < count:
+            cells = self.sample(min(SAMPLING_ROADMAP_SIZE, budget - drawn))
+            drawn += len(cells)
+            found = np.unique(np.concatenate((found, cells[self.codes(cells) == OBJECTIVE_CODE])), axis=0)
+        if len(found):
+            return found[:count]
+        objectives = self.maze.getObjectives()
+        picks = self.rng.choice(len(objectives), min(len(objectives), count), replace=False)
+        return self.toCells([objectives[i] for i in picks])
+
+    def toCells(self, angles):
+        return ((np.asarray(angles).reshape(-1, len(self.dims)) - self.offsets) // self.granularity).astype(np.int64)
+
+    def toAngles(self, cells):
+        return [tuple(int(angle) for angle in row) for row in (cells * self.granularity + self.offsets).tolist()]
+
+    def codes(self, cells):
+        return self.maze.getCodesFlat(cells @ self.strides)
+
+    def steer(self, start, target):
+        """This function returns the cell at most maxEdge away from start toward target
+        """
+        distance = np.sqrt(((target - start) ** 2).sum())
+        if distance <= self.maxEdge:
+            return target
+        return start + np.rint((target - start) * (self.maxEdge / distance)).astype(np.int64)
+
+    def freeSteps(self, starts, ends):
+        """This function returns, for every edge, the number of its steps before
+           the first wall, along with the cells and firsts of latticeSegments
+        """
+        cells, firsts = latticeSegments(starts, ends)
+        free = np.abs(ends - starts).sum(axis=1)
+        walls = np.nonzero(self.codes(cells) == WALL_CODE)[0]
+        if len(walls):
+            # The first wall of an edge is the smallest wall row at or after its first row
+            edges = np.searchsorted(firsts, walls, side='right') - 1
+            firstWall = np.full(len(free), len(cells), dtype=np.int64)
+            np.minimum.at(firstWall, edges, walls)
+            hit = firstWall < len(cells)
+            free[hit] = firstWall[hit] - firsts[hit]
+        return free, cells, firsts
+
+    def segment(self, start, end):
+        """This function returns the staircase from start to end, start excluded
+        """
+        return latticeSegments(start[None], end[None])[0]
+
+    def finish(self, waypoints, segments):
+        """This function shortcuts a path of waypoints and returns its angles,
+           one cell per step. segments[i] holds the cells from waypoint i to
+           waypoint i + 1 and is used where no shortcut is free.
+        """
+        waypoints = np.asarray(waypoints)
+        cells = [waypoints[:1]]
+        i = 0
+        while i < len(waypoints) - 1:
+            # Try the farthest later waypoints within reach first
+            later = np.arange(i + 2, len(waypoints))
+            near = np.sqrt(((waypoints[later] - waypoints[i]) ** 2).sum(axis=1)) <= SAMPLING_SHORTCUT_EDGES * self.maxEdge
+            later = later[near]
+            if len(later):
+                free, steps, firsts = self.freeSteps(np.repeat(waypoints[i:i + 1], len(later), axis=0), waypoints[later])
+                reached = np.nonzero(free == np.abs(waypoints[later] - waypoints[i]).sum(axis=1))[0]
+                if len(reached):
+                    j = reached[-1]
+                    cells.append(steps[firsts[j]:firsts[j] + free[j]])
+                    i = later[j]
+                    continue
+            cells.append(segments[i])
+            i += 1
+        return self.toAngles(np.concatenate(cells))
+
+
+class Tree:
+    """A tree of cells for RRT-Connect, rooted at one or more cells, that
+       remembers the staircase from every node's parent to the node
+    """
+    def __init__(self, roots):
+        self.cells = np.array(roots, dtype=np.int64)
+        self.count = len(roots)
+        self.parents = [-1] * self.count
+        self.segments = [None] * self.count
+
+    def add(self, parent, segment):
+        if self.count == len(self.cells):
+            self.cells = np.concatenate((self.cells, np.empty_like(self.cells)))
+        self.cells[self.count] = segment[-1]
+        self.parents.append(parent)
+        self.segments.append(segment)
+        self.count += 1
+        return self.count - 1
+
+    def extend(self, lattice, target):
+        """This function grows the tree from its node nearest to target by one
+           edge toward target, and returns the new node, the nearest node if
+           it is already at target, or None if the first step is a wall
+        """
+        nearest = int(((self.cells[:self.count] - target) ** 2).sum(axis=1).argmin())
+        start = self.cells[nearest]
+        if (start == target).all():
+            return nearest
+        end = lattice.steer(start, target)
+        free, cells, _ = lattice.freeSteps(start[None], end[None])
+        if free[0] == 0:
+            return None
+        return self.add(nearest, cells[:free[0]])
+
+    def connect(self, lattice, target):
+        """This function extends the tree toward target until it gets there or is
+           blocked, and returns the node at target or None
+        """
+        while True:
+            node = self.extend(lattice, target)
+            if node is None:
+                return None
+            if (self.cells[node] == target).all():
+                return node
+
+    def branch(self, node):
+        """This function returns the nodes from the root of node's branch to node
+        """
+        nodes = []
+        while node >= 0:
+            nodes.append(node)
+            node = self.parents[node]
+        return nodes[::-1]
+
+
+def rrtConnect(maze, start=None, seed=SAMPLING_SEED, maxSamples=SAMPLING_MAX_SAMPLES, timeLimit=SAMPLING_TIME_LIMIT):
+    """This function grows one tree from the start and one from objectives of the
+       maze toward shared random samples until they meet
+
+        Args:
+            maze (Maze): maze to plan on, its cells are looked up as needed
+            start (tuple): angles to plan from, the start of the maze if None;
+                ValueError if they are outside the maze or on a wall
+            seed (int): seed of the random numbers, equal seeds give equal paths
+            maxSamples (int): number of samples to draw at most
+            timeLimit (float): seconds to plan for at most
+
+        Return:
+            list: path of angle tuples from the start to an objective, [] if none was found
+    """
+    deadline = time.perf_counter() + timeLimit
+    rng = np.random.default_rng(seed)
+    lattice = Lattice(maze, rng)
+    start = maze.flatToAngle(search.startFlat(maze, start))
+    if maze.isObjective(*start):
+        return [start]
+    roots = lattice.sampleObjectives(SAMPLING_GOAL_ROOTS)
+    if not len(roots):
+        return []
+    trees = [Tree(lattice.toCells(start)), Tree(roots)]
+
+    for sample in range(maxSamples):
+        if time.perf_counter() > deadline:
+            break
+        grown, other = trees[sample % 2], trees[1 - sample % 2]
+        node = grown.extend(lattice, lattice.sample(1)[0])
+        if node is None:
+            continue
+        met = other.connect(lattice, grown.cells[node])
+        if met is None:
+            continue
+
+        startTree, goalTree = trees
+        startNode, goalNode = (node, met) if grown is startTree else (met, node)
+        startNodes, goalNodes = startTree.branch(startNode), goalTree.branch(goalNode)[::-1]
+        waypoints = [startTree.cells[n] for n in startNodes] + [goalTree.cells[n] for n in goalNodes[1:]]
+        segments = [startTree.segments[n] for n in startNodes[1:]]
+        # The goal tree is walked from the leaves to its root
+        for child, parent in zip(goalNodes[:-1], goalNodes[1:]):
+            segments.append(np.concatenate((goalTree.segments[child][::-1][1:], goalTree.cells[parent:parent + 1])))
+        return lattice.finish(waypoints, segments)
+    return []
+
+
+class Roadmap:
+    """A probabilistic roadmap over the free cells of a maze. Every node is
+       joined to its nearest nodes by free edges; the roadmap is kept between
+       queries and grown whenever it cannot answer one. It does not hold on to
+       the maze, which is passed to every query. prm queries it under its lock,
+       since a query may grow the roadmap.
+    """
+    def __init__(self, maze, seed=SAMPLING_SEED):
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        # The cells the roadmap was built on, a maze with new cells needs a new roadmap
+        self.mazeCells = maze.getCells()
+        self.cells = np.empty((0, len(maze.getDimensions())), dtype=np.int64)
+        self.isGoal = np.empty(0, dtype=bool)
+        self.neighbors = []
+        self.samples = 0
+        self.lock = threading.Lock()
+        # Node of every cell in the roadmap, by flat index
+        self.__nodes = {}
+
+        lattice = Lattice(maze, self.rng)
+        self.addNodes(lattice, lattice.sampleObjectives(SAMPLING_GOAL_ROOTS))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def addNodes(self, lattice, cells):
+        """This function adds the free cells among the given ones to the roadmap,
+           joins them to their nearest nodes, and returns the node of every
+           given cell, -1 for walls
+        """
+        first = len(self.cells)
+        added, addedGoals, result = [], [], []
+        for flat, cell, code in zip((cells @ lattice.strides).tolist(), cells, lattice.codes(cells)):
+            if code == WALL_CODE:
+                result.append(-1)
+                continue
+            if flat not in self.__nodes:
+                self.__nodes[flat] = first + len(added)
+                added.append(cell)
+                addedGoals.append(code == OBJECTIVE_CODE)
+                self.neighbors.append([])
+            result.append(self.__nodes[flat])
+        if added:
+            self.cells = np.concatenate((self.cells, added))
+            self.isGoal = np.concatenate((self.isGoal, addedGoals))
+            self.__connect(lattice, np.arange(first, len(self.cells)))
+        return result
+
+    def __connect(self, lattice, nodes):
+        # Candidate edges from every new node to its nearest nodes within reach,
+        # each edge stored from its lower to its higher node
+        count = min(SAMPLING_NEIGHBORS, len(self.cells) - 1)
+        if count <= 0:
+            return
+        # Nodes more than maxEdge apart along the first angle are never joined,
+        # so rows are taken in the order of that angle and only compared with
+        # the nodes in a window around them
+        byFirst = np.argsort(self.cells[:, 0], kind='stable')
+        firsts = self.cells[byFirst, 0]
+        nodes = nodes[np.argsort(self.cells[nodes, 0], kind='stable')]
+        far = np.iinfo(np.int64).max
+        reach = int(lattice.maxEdge ** 2)
+        pairs = []
+        for chunk in range(0, len(nodes), 256):
+            rows = nodes[chunk:chunk + 256]
+            low = np.searchsorted(firsts, self.cells[rows[0], 0] - lattice.maxEdge, side='left')
+            high = np.searchsorted(firsts, self.cells[rows[-1], 0] + lattice.maxEdge, side='right')
+            columns = byFirst[low:high]
+            distances = ((self.cells[rows][:, None, :] - self.cells[columns][None, :, :]) ** 2).sum(axis=2)
+            distances[(rows[:, None] == columns[None, :]) | (distances > reach)] = far
+            nearest = np.argpartition(distances, min(count, len(columns)) - 1, axis=1)[:, :count]
+            reachable = np.take_along_axis(distances, nearest, axis=1) < far
+            others = columns[nearest[reachable]]
+            ends = np.repeat(rows, nearest.shape[1])[reachable.reshape(-1)]
+            pairs.append(np.stack((np.minimum(ends, others), np.maximum(ends, others)), axis=1))
+        pairs = np.unique(np.concatenate(pairs), axis=0)
+        if not len(pairs):
+            return
+        starts, ends = self.cells[pairs[:, 0]], self.cells[pairs[:, 1]]
+        free, _, _ = lattice.freeSteps(starts, ends)
+        lengths = np.abs(ends - starts).sum(axis=1)
+        for (a, b), length in zip(pairs[free == lengths].tolist(), lengths[free == lengths].tolist()):
+            self.neighbors[a].append((b, length))
+            self.neighbors[b].append((a, length))
+
+    def grow(self, lattice, count):
+        """This function draws count samples and adds the free ones to the roadmap
+        """
+        self.samples += count
+        self.addNodes(lattice, lattice.sample(count))
+
+    def shortestPath(self, start):
+        """This function returns the nodes of the shortest roadmap path from the
+           start node to a goal node, or None
+        """
+        distances = {start: 0}
+        parents = {start: -1}
+        queue = [(0, start)]
+        while queue:
+            distance, node = heappop(queue)
+            if distance > distances[node]:
+                continue
+            if self.isGoal[node]:
+                nodes = []
+                while node >= 0:
+                    nodes.append(node)
+                    node = parents[node]
+                return nodes[::-1]
+            for other, length in self.neighbors[node]:
+                if distance + length < distances.get(other, np.inf):
+                    distances[other] = distance + length
+                    parents[other] = node
+                    heappush(queue, (distance + length, other))
+        return None
+
+    def query(self, maze, start, maxSamples=SAMPLING_MAX_SAMPLES, timeLimit=SAMPLING_TIME_LIMIT):
+        """This function returns a path of angle tuples from start to an objective
+           of the maze, doubling the roadmap until one is found, maxSamples
+           samples have been drawn for it, or timeLimit seconds have passed
+        """
+        deadline = time.perf_counter() + timeLimit
+        if not self.isGoal.any():
+            return []
+        lattice = Lattice(maze, self.rng)
+        if self.samples == 0:
+            self.grow(lattice, min(SAMPLING_ROADMAP_SIZE, maxSamples))
+        node = self.addNodes(lattice, lattice.toCells(start))[0]
+        if node < 0:
+            return []
+        while True:
+            nodes = self.shortestPath(node)
+            if nodes is not None:
+                break
+            if self.samples >= maxSamples or time.perf_counter() > deadline:
+                return []
+            self.grow(lattice, min(max(self.samples, 1), maxSamples - self.samples))
+
+        segments = []
+        for a, b in zip(nodes[:-1], nodes[1:]):
+            low, high = min(a, b), max(a, b)
+            cells = lattice.segment(self.cells[low], self.cells[high])
+            if a > b:
+                cells = np.concatenate((cells[::-1][1:], self.cells[b:b + 1]))
+            segments.append(cells)
+        return lattice.finish(self.cells[nodes], segments)
+
+
+# Roadmap of every maze prm has planned on, dropped with the maze
+_roadmaps = weakref.WeakKeyDictionary()
+
+def prm(maze, start=None, seed=SAMPLING_SEED, maxSamples=SAMPLING_MAX_SAMPLES, timeLimit=SAMPLING_TIME_LIMIT):
+    """This function plans from start on the roadmap kept for the maze, so
+       later queries on the same maze reuse what earlier ones built. The
+       arguments are those of rrtConnect.
+    """
+    start = maze.flatToAngle(search.startFlat(maze, start))
+    roadmap = _roadmaps.get(maze)
+    if roadmap is None or roadmap.seed != seed or roadmap.mazeCells is not maze.getCells():
+        roadmap = _roadmaps[maze] = Roadmap(maze, seed)
+    with roadmap.lock:
+        return roadmap.query(maze, start, maxSamples, timeLimit)
+
+
+if __name__ == '__main__':
+    import contextlib
+    import io
+    from arm import Arm
+    from search import bfs
+    from transform import transformToMaze, transformToLazyMaze
+    from util import getMapNames, loadMapConfig
+
+    # Staircases move one angle by one cell per step and end at their end cell
+    rng = np.random.default_rng(0)
+    starts, ends = rng.integers(0, 30, (200, 3)), rng.integers(0, 30, (200, 3))
+    cells, firsts = latticeSegments(starts, ends)
+    for edge in range(len(starts)):
+        steps = np.concatenate((starts[edge:edge + 1], cells[firsts[edge]:firsts[edge] + np.abs(ends[edge] - starts[edge]).sum()]))
+        assert (np.abs(np.diff(steps, axis=0)).sum(axis=1) == 1).all() and (steps[-1] == ends[edge]).all()
+
+    # Both planners must find valid paths wherever bfs finds one, on full and
+    # lazy mazes, and give the same path for the same seed.
+    for configfile, granularity in [(CONFIG_FILE, 2), ("test_config_part4.txt", 10)]:
+        for map_name in getMapNames(configfile):
+            window, armBase, armLinks, obstacles, goals = loadMapConfig(configfile, map_name)
+            maze = transformToMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+            with contextlib.redirect_stdout(io.StringIO()):
+                reachable = bool(bfs(maze))
+            for planner in [rrtConnect, prm]:
+                lazy = transformToLazyMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+                path = planner(lazy, seed=1)
+                assert bool(path) == reachable, (map_name, planner.__name__)
+                assert not path or maze.isValidPath(path) == "Valid", (map_name, planner.__name__)
+                assert planner(maze, seed=1) == path, (map_name, planner.__name__)
+
+            # A second query on the same maze reuses its roadmap
+            roadmap = _roadmaps[maze]
+            size = len(roadmap)
+            assert prm(maze, seed=1) == path and len(roadmap) == size, map_name
+
+            # A tree that already holds the target connects to it at once
+            lattice = Lattice(maze, rng)
+            root = lattice.toCells(maze.getStart())
+            assert Tree(root).connect(lattice, root[0]) == 0, map_name
+
+    print("Test passed\n")
@@ -17,52 +17,423 @@ This file contains search functions.
 # maze is a Maze object based on the maze from the file specified by input filename
 # searchMethod is the search method specified by --method flag (bfs,astar)
 # You may need to slight change your previous search functions in MP1 since this is 3-d maze
+#
+# The path is returned; the number of states explored is added to the
+# 'states_expanded' counter of the metrics module when metrics are enabled.
 
+import numpy as np
+import metrics
+import sampling
 from collections import deque
 from heapq import heappop, heappush
+from const import *
 
-def search(maze, searchMethod):
+def search(maze, searchMethod, start=None):
+    """
+    This function runs the given search method from start, or from the start
+    of the maze if start is None. Passing the start leaves the maze unchanged,
+    so several threads can search one maze from different starts. A start
+    outside the maze or on a wall raises ValueError.
+    """
     return {
         "bfs": bfs,
-    }.get(searchMethod, [])(maze)
+        "bibfs": bibfs,
+        "field": field,
+        "jps": jps,
+        "astar": astar,
+        "wastar": wastar,
+        "prm": prm,
+        "rrt": rrt,
+    }.get(searchMethod, [])(maze, start)
 
-def bfs(maze):
-    # Write your code here
+def bfs(maze, start=None):
     """
     This function returns optimal path in a list, which contains start and objective.
     If no path found, return None. 
+
+    The search runs on the flat cell indices of the maze: the frontier is a
+    deque of integers and the visited flags and parents live in preallocated
+    NumPy arrays. Angles are only computed again when the path is rebuilt.
     """
-    q = []
-    visited = {}
-    q.append(maze.getStart())
-    pairs = {}  # maps from 2nd step -> first step
+    start = startFlat(maze, start)
+    visited = np.zeros(len(maze.getCells()), dtype=np.uint8)
+    parents = np.full(len(maze.getCells()), -1, dtype=np.int64)
+    # memoryviews give plain int access to the arrays, much faster than numpy scalars
+    seen = memoryview(visited)
+    pairs = memoryview(parents)  # maps from 2nd step -> first step
 
+    q = deque([start])
+    seen[start] = 1
     wonSpot = None
-    while len(q) > 0:
-        curr = q.pop(0)
-        if maze.isObjective(curr[0], curr[1]):
+    while q:
+        curr = q.popleft()
+        if maze.isObjectiveFlat(curr):
             wonSpot = curr
             break
-        neighbors = maze.getNeighbors(curr[0], curr[1])
-        for n in neighbors:
-            if n not in visited:
-                # print("appending", n)
-                visited[n] = True
-                q.append(n)
+        for n in maze.getNeighborsFlat(curr):
+            if not seen[n]:
+                seen[n] = 1
                 pairs[n] = curr
+                q.append(n)
 
-    #print("done", wonSpot)
-    # now reconstruct path
-    if wonSpot != None:
-        curr = wonSpot
-        path = []
-        while curr != maze.getStart():
-            path.append(curr)
-            curr = pairs[curr]
-        path.append(curr)
-        path.reverse()
-        print("path:", path)
-        return path
-    else:
+    if metrics.enabled:
+        # every visited state was queued, and all but the ones still queued were expanded
+        metrics.count('states_expanded', int(visited.sum()) - len(q))
+    if wonSpot is None:
         print("no path")
         return []
+    return reconstructPath(maze, pairs, start, wonSpot)
+
+def bibfs(maze, start=None):
+    """
+    This function returns optimal path in a list, which contains start and objective,
+    using breadth-first search from the start and from all objectives at once.
+
+    Each round expands one whole level of the smaller frontier. Once the
+    two searches reach a common cell, the rest of that level is still
+    expanded and the shortest of the joined paths is returned.
+    """
+    start = startFlat(maze, start)
+    if maze.isObjectiveFlat(start):
+        return [maze.flatToAngle(start)]
+    size = len(maze.getCells())
+    # index 0 is the search from the start, index 1 the one from the objectives
+    distances = [np.full(size, -1, dtype=np.int32) for _ in range(2)]
+    parents = [np.full(size, -1, dtype=np.int64) for _ in range(2)]
+    dist = [memoryview(d) for d in distances]
+    pairs = [memoryview(p) for p in parents]
+    frontiers = [[start], [maze.angleToFlat(objective) for objective in maze.getObjectives()]]
+    dist[0][start] = 0
+    for objective in frontiers[1]:
+        dist[1][objective] = 0
+
+    expanded = 0
+    best = None  # (path length, cell reached by both searches)
+    while best is None and frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        mine, other, pair = dist[side], dist[1 - side], pairs[side]
+        nextFrontier = []
+        for curr in frontiers[side]:
+            expanded += 1
+            depth = mine[curr] + 1
+            for n in maze.getNeighborsFlat(curr):
+                if mine[n] < 0:
+                    mine[n] = depth
+                    pair[n] = curr
+                    nextFrontier.append(n)
+                    # A cell both searches reached joins them; every such
+                    # cell is seen here when the second search reaches it.
+                    if other[n] >= 0 and (best is None or depth + other[n] < best[0]):
+                        best = (depth + other[n], n)
+        frontiers[side] = nextFrontier
+
+    if metrics.enabled:
+        metrics.count('states_expanded', expanded)
+    if best is None:
+        print("no path")
+        return []
+    _, meet = best
+    path = reconstructPath(maze, pairs[0], start, meet)
+    while dist[1][meet] > 0:
+        meet = pairs[1][meet]
+        path.append(maze.flatToAngle(meet))
+    return path
+
+def field(maze, start=None):
+    """
+    This function returns optimal path in a list, which contains start and objective,
+    by walking down the goal distance field of the maze. The field is computed
+    on first use and kept on the maze, so later queries from other starts on
+    the same maze only cost the length of their path.
+    """
+    path = maze.getPathFrom(maze.flatToAngle(startFlat(maze, start)))
+    if metrics.enabled:
+        metrics.count('states_expanded', len(path))
+    if not path:
+        print("no path")
+    return path
+
+def jps(maze, start=None):
+    """
+    This function returns optimal path in a list, which contains start and objective,
+    using A* over jump points instead of single cells.
+
+    Among the shortest paths there is always one that moves along higher
+    angles as early as it can: a step along a lower angle followed by a step
+    along a higher one can be swapped unless the swap runs into a wall. A
+    search moving along an angle therefore continues straight, turns onto
+    any lower angle, and only turns onto a higher angle at a forced
+    neighbor. Where such a move can next change direction is looked up in
+    the jump tables of the maze, so open regions are crossed in one step.
+    """
+    start = startFlat(maze, start)
+    if maze.isObjectiveFlat(start):
+        return [maze.flatToAngle(start)]
+    tables = maze.getJumpTables()
+    heuristic = memoryview(objectiveDistances(maze).reshape(-1))
+    axes = list(zip(maze.getStrides(), maze.getDimensions()))
+    numMoves = 2 * len(axes)
+    # move d steps by moves[d] cells; the start state has move numMoves
+    moves = [stride * step for stride, _ in axes for step in (1, -1)]
+
+    def successors(flat, move):
+        if move == numMoves:
+            return range(numMoves)
+        axis, step = divmod(move, 2)
+        turns = [move] + list(range(2 * axis))
+        back = flat - moves[move]
+        for higher in range(axis + 1, len(axes)):
+            stride, size = axes[higher]
+            idx = flat // stride % size
+            for turn, inside in ((2 * higher, idx + 1 < size), (2 * higher + 1, idx > 0)):
+                if inside and not maze.isWallFlat(flat + moves[turn]) and maze.isWallFlat(back + moves[turn]):
+                    turns.append(turn)
+        return turns
+
+    # States are (cell, move that reached it); costs and parents are keyed by
+    # flat * (numMoves + 1) + move.
+    key = start * (numMoves + 1) + numMoves
+    costs = {key: 0}
+    parents = {key: None}
+    closed = set()
+    q = [(heuristic[start], 0, start, numMoves)]
+    while q:
+        _, negCost, curr, move = heappop(q)
+        key = curr * (numMoves + 1) + move
+        if key in closed:
+            continue
+        closed.add(key)
+        if maze.isObjectiveFlat(curr):
+            if metrics.enabled:
+                metrics.count('states_expanded', len(closed))
+            return jumpPath(maze, parents, key, moves)
+        for turn in successors(curr, move):
+            length = tables[turn][curr]
+            if length == 0:
+                continue
+            n = curr + length * moves[turn]
+            nextCost = length - negCost
+            nextKey = n * (numMoves + 1) + turn
+            if nextKey not in closed and nextCost < costs.get(nextKey, nextCost + 1):
+                costs[nextKey] = nextCost
+                parents[nextKey] = key
+                heappush(q, (nextCost + heuristic[n], -nextCost, n, turn))
+
+    if metrics.enabled:
+        metrics.count('states_expanded', len(closed))
+    print("no path")
+    return []
+
+def jumpPath(maze, parents, key, moves):
+    """
+    This function returns the path of angle tuples through the chain of jump
+    point states ending at key, filling in the straight runs between them.
+    Every key is flat * (len(moves) + 1) + the move that reached the cell.
+    """
+    path = []
+    while parents[key] is not None:
+        flat, move = divmod(key, len(moves) + 1)
+        prev = parents[key] // (len(moves) + 1)
+        path.extend(maze.flatToAngle(n) for n in range(flat, prev, -moves[move]))
+        key = parents[key]
+    path.append(maze.flatToAngle(key // (len(moves) + 1)))
+    path.reverse()
+    return path
+
+def astar(maze, start=None):
+    """
+    This function returns optimal path in a list, which contains start and objective,
+    using A* with the number of steps to the nearest objective as heuristic.
+    """
+    return weightedAstar(maze, 1.0, start)
+
+def wastar(maze, start=None, weight=DEFAULT_WASTAR_WEIGHT):
+    """
+    This function returns a path in a list, which contains start and objective,
+    using weighted A*. The path is at most weight times longer than optimal.
+    """
+    return weightedAstar(maze, weight, start)
+
+def weightedAstar(maze, weight, start=None):
+    """
+    This function runs A* over the flat cell indices of the maze with the
+    heuristic scaled by weight. The heuristic is the Manhattan distance, in
+    steps, from a cell to the nearest objective; every move changes one angle
+    by one step, so it never overestimates and weight 1 gives optimal paths.
+    Only cells that are pushed on the frontier are ever looked at.
+    """
+    start = startFlat(maze, start)
+    size = len(maze.getCells())
+    heuristic = memoryview(objectiveDistances(maze).reshape(-1))
+    costs = np.full(size, -1, dtype=np.int64)
+    closed = np.zeros(size, dtype=np.uint8)
+    parents = np.full(size, -1, dtype=np.int64)
+    cost = memoryview(costs)
+    done = memoryview(closed)
+    pairs = memoryview(parents)
+
+    # Ties on f are broken towards the deeper state, which reaches the goal
+    # without expanding the whole f-plateau first.
+    cost[start] = 0
+    q = [(heuristic[start] * weight, 0, start)]
+    while q:
+        _, negCost, curr = heappop(q)
+        if done[curr]:
+            continue
+        done[curr] = 1
+        if maze.isObjectiveFlat(curr):
+            if metrics.enabled:
+                metrics.count('states_expanded', int(closed.sum()))
+            return reconstructPath(maze, pairs, start, curr)
+        nextCost = 1 - negCost
+        for n in maze.getNeighborsFlat(curr):
+            if not done[n] and (cost[n] < 0 or cost[n] > nextCost):
+                cost[n] = nextCost
+                pairs[n] = curr
+                heappush(q, (nextCost + heuristic[n] * weight, -nextCost, n))
+
+    if metrics.enabled:
+        metrics.count('states_expanded', int(closed.sum()))
+    print("no path")
+    return []
+
+def prm(maze, start=None):
+    """
+    This function plans on a probabilistic roadmap, see sampling.py. The
+    roadmap is kept for the maze, so later searches on it only add what they
+    need. The path is a valid lattice path but usually not a shortest one.
+    """
+    path = sampling.prm(maze, start=start)
+    if not path:
+        print("no path")
+    return path
+
+def rrt(maze, start=None):
+    """
+    This function plans with RRT-Connect, see sampling.py. The path is a valid
+    lattice path but usually not a shortest one.
+    """
+    path = sampling.rrtConnect(maze, start=start)
+    if not path:
+        print("no path")
+    return path
+
+def startFlat(maze, start):
+    """
+    This function returns the flat index of start, or of the start of the maze
+    if start is None. A start outside the maze or on a wall raises ValueError,
+    so every method rejects it alike instead of planning from another cell.
+    """
+    start = maze.getStart() if start is None else start
+    flat = maze.angleToFlat(start) if len(start) == len(maze.getDimensions()) else -1
+    if flat < 0 or maze.isWallFlat(flat):
+        raise ValueError("Start %s is not a free cell of the maze" % (tuple(start),))
+    return flat
+
+def objectiveDistances(maze):
+    """
+    This function returns, for every cell of the maze, the Manhattan distance
+    in steps to the nearest objective cell, ignoring walls. Since the
+    distance is a sum over the angles, it is computed with one forward and
+    one backward sweep along each angle instead of a search.
+    """
+    unreachable = np.iinfo(np.int32).max // 2
+    distances = np.full(maze.getDimensions(), unreachable, dtype=np.int32)
+    distances.reshape(-1)[[maze.angleToFlat(objective) for objective in maze.getObjectives()]] = 0
+    for axis in range(distances.ndim):
+        sweep = np.moveaxis(distances, axis, 0)
+        for i in range(1, sweep.shape[0]):
+            np.minimum(sweep[i:i+1], sweep[i-1:i] + 1, out=sweep[i:i+1])
+        for i in range(sweep.shape[0] - 2, -1, -1):
+            np.minimum(sweep[i:i+1], sweep[i+1:i+2] + 1, out=sweep[i:i+1])
+    return distances
+
+def reconstructPath(maze, pairs, start, end):
+    """
+    This function follows the parent links in pairs back from the flat index
+    end to start and returns the path as a list of angle tuples.
+    """
+    curr = end
+    path = []
+    while curr != start:
+        path.append(maze.flatToAngle(curr))
+        curr = pairs[curr]
+    path.append(maze.flatToAngle(start))
+    path.reverse()
+    return path
+
+
+if __name__ == '__main__':
+    import contextlib
+    import io
+    from arm import Arm
+    from maze import Maze
+    from transform import transformToMaze
+    from util import getMapNames, loadMapConfig
+
+    # The pruned and bidirectional searches must match bfs on random 1-, 2-
+    # and 3-angle mazes too, with and without paths to an objective.
+    rng = np.random.default_rng(0)
+    for trial in range(500):
+        dims = tuple(int(size) for size in rng.integers(4, [40, 14, 8][:trial % 3 + 1]))
+        cells = np.where(rng.random(dims) < rng.uniform(0.05, 0.5), WALL_CODE, SPACE_CODE).astype(np.uint8)
+        picks = rng.permutation(cells.size)[:4]
+        cells.reshape(-1)[picks] = [START_CODE] + [OBJECTIVE_CODE] * 3
+        maze = Maze(cells, (0,) * len(dims), 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = len(bfs(maze))
+            for method in ["bibfs", "field", "jps"]:
+                path = search(maze, method)
+                assert len(path) == expected and (not path or maze.isValidPath(path) == "Valid"), (dims, method)
+
+    # Every optimal method must find a valid path as short as the one of bfs,
+    # and wastar a valid path no more than weight times longer.
+    for configfile, granularity in [(CONFIG_FILE, 2), (CONFIG_FILE, 5), ("test_config_part4.txt", 10)]:
+        for map_name in getMapNames(configfile):
+            window, armBase, armLinks, obstacles, goals = loadMapConfig(configfile, map_name)
+            maze = transformToMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+            expected = len(bfs(maze))
+            for method in ["bibfs", "field", "jps", "astar", "wastar"]:
+                path = search(maze, method)
+                assert maze.isValidPath(path) == "Valid", (map_name, granularity, method)
+                if method == "wastar":
+                    assert len(path) - 1 <= (expected - 1) * DEFAULT_WASTAR_WEIGHT, (map_name, granularity, method)
+                else:
+                    assert len(path) == expected, (map_name, granularity, method)
+
+            # Batch validation must give the messages of isValidPath, also for broken paths
+            path = bfs(maze)
+            paths = [path, path[::-1], path[:-1], path[:1] + path[2:],
+                     [tuple(angle + 400 for angle in path[0])] + path[1:]]
+            assert maze.validatePaths(paths) == [maze.isValidPath(p) for p in paths], (map_name, granularity)
+
+            # Searches from a given start must match bfs from there and leave
+            # the start of the maze alone
+            start = path[len(path) // 2]
+            expected = len(bfs(maze, start))
+            for method in ["bibfs", "field", "jps", "astar"]:
+                other = search(maze, method, start)
+                assert len(other) == expected and other[0] == start, (map_name, granularity, method)
+            assert maze.getStart() == path[0], (map_name, granularity)
+
+            # Starts outside the maze or on a wall are rejected by every method
+            walls = np.nonzero(maze.getCells() == WALL_CODE)[0][:1]
+            for bad in [tuple(angle + 400 for angle in path[0]), path[0][:-1]] + [maze.flatToAngle(int(w)) for w in walls]:
+                for method in ["bfs", "bibfs", "field", "jps", "astar", "wastar", "prm", "rrt"]:
+                    try:
+                        search(maze, method, bad)
+                    except ValueError:
+                        continue
+                    raise AssertionError((map_name, granularity, method, bad))
+
+        # The component labels must agree with the goal distances: a cell can
+        # reach an objective iff it shares a region with one.
+        components = np.array([maze.getComponent(*angles) for angles in maze.getObjectives()])
+        for flat in range(0, len(maze.getCells()), 7):
+            angles = maze.flatToAngle(flat)
+            reachable = maze.getComponent(*angles) >= 0 and maze.getComponent(*angles) in components
+            assert reachable == (maze.getGoalDistance(*angles) >= 0), (map_name, granularity, angles)
+            if reachable:
+                assert len(maze.getPathFrom(angles)) == maze.getGoalDistance(*angles) + 1
+
+    print("Test passed\n")
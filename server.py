@@ -0,0 +1,281 @@
+# server.py
+# ---------------
+# Licensing Information:  You are free to use or extend this projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to the University of Illinois at Urbana-Champaign
+
+"""
+This file contains the planning service.
+
+It answers plan requests over a Unix socket or localhost TCP and keeps the
+transformed mazes in memory, so repeated queries on a map only pay for the
+search. Every line a client sends is a JSON object, answered by one JSON line
+in the same order:
+
+    {"id": 1, "config": "test_config.txt", "map": "Test1", "granularity": 2, "method": "bfs"}
+    {"id": 2, "scene": {"window": [300, 200], "armBase": [150, 190],
+                        "armLinks": [[100, 90, 15, [0, 180]], [50, 60, 15, [-150, 150]]],
+                        "obstacles": [[125, 70, 10]], "goals": [[110, 40, 10]]},
+     "granularity": 2, "method": "astar", "start": [40, 0]}
+    {"stats": true}
+
+The scene is a map section of a configuration file or given inline, and the
+start defaults to the arm angles of the scene. Scenes that differ only in the
+arm angles share one maze. Transforms run on a process pool and searches on a
+thread pool, so clients are served concurrently.
+
+    python server.py --socket /tmp/mp2.sock
+    python server.py --port 8440 --workers 4 --cache-bytes 1000000000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from arm import Arm
+from maze import Maze
+from transform import transformToGrid, mazeCacheKey
+from search import search
+from const import *
+from util import *
+
+SEARCH_METHODS = ["bfs", "bibfs", "field", "jps", "astar", "wastar", "prm", "rrt"]
+
+
+class CachedMaze:
+    """A maze kept by the service with the bytes it held when last measured.
+       Searches pass their start instead of setting it, so any number of them
+       may run on the maze at once.
+    """
+    __slots__ = ('maze', 'size')
+
+    def __init__(self, maze):
+        self.maze = maze
+        self.size = maze.getMemoryUsage()
+
+
+class MazeCache:
+    """Mazes by mazeCacheKey, dropping the least recently used ones once they
+       hold more than budget bytes together. Only the event loop touches it.
+    """
+    def __init__(self, budget=SERVER_CACHE_BYTES):
+        self.budget = budget
+        self.__entries = OrderedDict()
+        self.__size = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def getSize(self):
+        return self.__size
+
+    def get(self, key):
+        entry = self.__entries.get(key)
+        if entry is not None:
+            self.__entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.__entries[key] = entry
+        self.__size += entry.size
+        self.__evict()
+
+    def update(self, key):
+        """This function measures a maze again after a search stored fields on it
+        """
+        entry = self.__entries.get(key)
+        if entry is not None:
+            size = entry.maze.getMemoryUsage()
+            self.__size += size - entry.size
+            entry.size = size
+            self.__evict()
+
+    def __evict(self):
+        while self.__size > self.budget and self.__entries:
+            _, entry = self.__entries.popitem(last=False)
+            self.__size -= entry.size
+
+
+def transformScene(scene, granularity):
+    """This function returns the grid of character codes of a scene, run on the
+       transform pool
+    """
+    window, armBase, armLinks, obstacles, goals = scene
+    return transformToGrid(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+
+
+def searchMaze(entry, start, method):
+    """This function searches a cached maze from the given start, run on the
+       search pool, and returns (path, status, seconds)
+    """
+    maze = entry.maze
+    begin = time.perf_counter()
+    path = search(maze, method, start)
+    seconds = time.perf_counter() - begin
+    status = maze.isValidPath(path) if path else "No path found"
+    return path, status, seconds
+
+
+class PlanningService:
+    def __init__(self, cacheBytes=SERVER_CACHE_BYTES, workers=os.cpu_count()):
+        self.cache = MazeCache(cacheBytes)
+        self.transformPool = ProcessPoolExecutor(max_workers=workers)
+        self.searchPool = ThreadPoolExecutor(max_workers=workers)
+        # Transforms in progress by key, so concurrent misses build a maze once
+        self.__pending = {}
+        # Parsed configuration file sections by (config, map), with the file's mtime
+        self.__scenes = {}
+
+    def close(self):
+        self.transformPool.shutdown(cancel_futures=True)
+        self.searchPool.shutdown(cancel_futures=True)
+
+    def readScene(self, request):
+        """This function returns (window, armBase, armLinks, obstacles, goals) of a request
+        """
+        if "scene" in request:
+            scene = request["scene"]
+            return tuple(scene[key] for key in ["window", "armBase", "armLinks", "obstacles", "goals"])
+        key = (request["config"], request["map"])
+        mtime = os.path.getmtime(request["config"])
+        if key not in self.__scenes or self.__scenes[key][0] != mtime:
+            self.__scenes[key] = (mtime, loadMapConfig(*key))
+        return self.__scenes[key][1]
+
+    async def getMaze(self, scene, arm, granularity):
+        """This function returns (key, entry, cached) for the maze of a scene,
+           transforming it on the process pool if it is not cached
+        """
+        window, armBase, armLinks, obstacles, goals = scene
+        key = mazeCacheKey(arm, goals, obstacles, window, granularity, withStart=False)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return key, entry, True
+        if key not in self.__pending:
+            self.__pending[key] = asyncio.ensure_future(self.__build(key, arm, scene, granularity))
+        return key, await asyncio.shield(self.__pending[key]), False
+
+    async def __build(self, key, arm, scene, granularity):
+        try:
+            grid = await asyncio.get_running_loop().run_in_executor(
+                self.transformPool, transformScene, scene, granularity)
+        finally:
+            del self.__pending[key]
+        if not (grid == OBJECTIVE_CODE).any():
+            raise ValueError("Maze has no objectives")
+        offsets = tuple(limit[0] for limit in arm.getArmLimit())
+        entry = CachedMaze(Maze(grid, offsets, granularity, start=tuple(arm.getArmAngle())))
+        self.cache.put(key, entry)
+        return entry
+
+    async def plan(self, request):
+        """This function answers one plan request with a dict of the path and
+           its statistics, in the keys batch.py uses
+        """
+        method = request.get("method", "bfs")
+        if method not in SEARCH_METHODS:
+            raise ValueError("Unknown method %s" % method)
+        granularity = request.get("granularity", DEFAULT_GRANULARITY)
+
+        begin = time.perf_counter()
+        scene = self.readScene(request)
+        arm = Arm(scene[1], scene[2])
+        key, entry, cached = await self.getMaze(scene, arm, granularity)
+        transformSeconds = time.perf_counter() - begin
+
+        # A start between cells is moved into the cell below it, as transformToMaze does
+        maze = entry.maze
+        start = tuple(request.get("start") or arm.getArmAngle())
+        flat = maze.angleToFlat(start) if len(start) == len(maze.getDimensions()) else -1
+        if flat < 0 or maze.isWallFlat(flat):
+            raise ValueError("Start %s is not a free cell of the maze" % (start,))
+        start = maze.flatToAngle(flat)
+
+        path, status, searchSeconds = await asyncio.get_running_loop().run_in_executor(
+            self.searchPool, searchMaze, entry, start, method)
+        self.cache.update(key)
+        return {
+            "path": path,
+            "path_length": len(path),
+            "status": status,
+            "cached": cached,
+            "transform_seconds": transformSeconds,
+            "search_seconds": searchSeconds,
+        }
+
+    async def respond(self, line):
+        """This function returns the response to one request line
+        """
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Requests must be JSON objects")
+            if request.get("stats"):
+                response = {"mazes": len(self.cache), "bytes": self.cache.getSize(), "budget": self.cache.budget}
+            else:
+                response = await self.plan(request)
+        except (Exception, SystemExit) as e:
+            # Arm and Maze report bad scenes by raising SystemExit
+            response = {"error": str(e) or repr(e)}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    async def handle(self, reader, writer):
+        """This function serves one client connection, a request at a time
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    response = await self.respond(line)
+                    writer.write((json.dumps(response) + "\n").encode())
+                    await writer.drain()
+        except (ConnectionError, ValueError):
+            # ValueError: a line longer than SERVER_LINE_LIMIT
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service, socketPath=None, host="127.0.0.1", port=SERVER_PORT):
+    """This function runs the service until it is cancelled
+    """
+    if socketPath:
+        server = await asyncio.start_unix_server(service.handle, socketPath, limit=SERVER_LINE_LIMIT)
+    else:
+        server = await asyncio.start_server(service.handle, host, port, limit=SERVER_LINE_LIMIT)
+    print("Serving on", ", ".join(str(sock.getsockname()) for sock in server.sockets))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CS440 MP2 Robotic Arm planning service')
+    parser.add_argument('--socket', dest="socketPath", type=str, default=None,
+                        help='Unix socket to listen on - default TCP')
+    parser.add_argument('--host', type=str, default="127.0.0.1",
+                        help='TCP address to listen on - default 127.0.0.1')
+    parser.add_argument('--port', type=int, default=SERVER_PORT,
+                        help='TCP port to listen on - default ' + str(SERVER_PORT))
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of transform processes and search threads - default one per CPU')
+    parser.add_argument('--cache-bytes', dest="cacheBytes", type=int, default=SERVER_CACHE_BYTES,
+                        help='memory kept for cached mazes - default ' + str(SERVER_CACHE_BYTES))
+    args = parser.parse_args()
+
+    service = PlanningService(args.cacheBytes, args.workers)
+    try:
+        asyncio.run(serve(service, args.socketPath, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,150 @@
+# spatial.py
+# ---------------
+# Licensing Information:  You are free to use or extend this projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to the University of Illinois at Urbana-Champaign
+
+"""
+This file contains the spatial index over the circles (obstacles and goals)
+of a map, used to limit collision tests to the circles near an arm link.
+"""
+
+import math
+import numpy as np
+from const import *
+
+
+class CircleGrid:
+    """Uniform grid over the window, where every bucket lists the circles whose
+       bounding box overlaps it. Circles and queries that fall outside the
+       window are clamped into the border buckets, so lookups stay conservative
+       for any coordinates.
+    """
+    def __init__(self, circles, window, cellSize=None):
+        """
+            Args:
+                circles (list): [(x, y, r)] of obstacles or goals
+                window (tuple): (width, height) of the window
+                cellSize (float): edge length of a bucket, by default about one
+                                  circle per bucket but no smaller than a circle
+        """
+        self.__circles = list(circles)
+        array = np.asarray(self.__circles, dtype=np.float64).reshape(-1, 3)
+        self.__x, self.__y, self.__r = array[:, 0], array[:, 1], array[:, 2]
+        if cellSize is None:
+            cellSize = math.sqrt(window[0] * window[1] / max(len(self.__circles), 1))
+            if len(self.__circles):
+                cellSize = max(cellSize, 2 * float(self.__r.mean()))
+        self.__cellSize = max(float(cellSize), 1.0)
+        self.__cols = int(window[0] // self.__cellSize) + 1
+        self.__rows = int(window[1] // self.__cellSize) + 1
+
+        # Compressed bucket lists: the circles of bucket b are
+        # self.__bucketCircles[self.__bucketStart[b]:self.__bucketStart[b + 1]]
+        buckets, circleIdx = self.__expand(self.__x - self.__r, self.__y - self.__r,
+                                           self.__x + self.__r, self.__y + self.__r)
+        order = np.argsort(buckets, kind='stable')
+        self.__bucketCircles = circleIdx[order]
+        counts = np.bincount(buckets, minlength=self.__cols * self.__rows)
+        self.__bucketStart = np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self):
+        return len(self.__circles)
+
+    def __iter__(self):
+        return iter(self.__circles)
+
+    def getCircles(self):
+        return self.__circles
+
+    def getArrays(self):
+        """This function returns the x, y and r float arrays of the circles
+        """
+        return self.__x, self.__y, self.__r
+
+    def __bucketRange(self, low, high, count):
+        low = np.clip(np.floor(np.asarray(low) / self.__cellSize), 0, count - 1).astype(np.int64)
+        high = np.clip(np.floor(np.asarray(high) / self.__cellSize), 0, count - 1).astype(np.int64)
+        return low, high
+
+    def __expand(self, minX, minY, maxX, maxY):
+        """This function returns (bucket, box) index pairs for every bucket
+           that each of the boxes overlaps
+        """
+        x0, x1 = self.__bucketRange(minX, maxX, self.__cols)
+        y0, y1 = self.__bucketRange(minY, maxY, self.__rows)
+        width = x1 - x0 + 1
+        sizes = width * (y1 - y0 + 1)
+        box = np.repeat(np.arange(len(sizes)), sizes)
+        local = np.arange(len(box)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        buckets = (y0[box] + local // width[box]) * self.__cols + x0[box] + local % width[box]
+        return buckets, box
+
+    def candidatePairs(self, minX, minY, maxX, maxY):
+        """This function returns the candidate (box, circle) index pairs of a
+           batch of axis-aligned boxes: every circle whose bounding box overlaps
+           a box is paired with it, possibly more than once.
+
+            Args:
+                minX, minY, maxX, maxY (ndarray): corners of the query boxes
+
+            Return:
+                (boxIdx, circleIdx) int64 arrays of equal length
+        """
+        buckets, box = self.__expand(minX, minY, maxX, maxY)
+        starts = self.__bucketStart[buckets]
+        sizes = self.__bucketStart[buckets + 1] - starts
+        pairBox = np.repeat(box, sizes)
+        local = np.arange(len(pairBox)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        return pairBox, self.__bucketCircles[np.repeat(starts, sizes) + local]
+
+    def candidates(self, minX, minY, maxX, maxY):
+        """This function returns the circles whose bounding box may overlap
+           the given box, each circle once, in their original order
+        """
+        x0, x1 = self.__bucketRange(minX, maxX, self.__cols)
+        y0, y1 = self.__bucketRange(minY, maxY, self.__rows)
+        found = set()
+        for row in range(int(y0), int(y1) + 1):
+            for col in range(int(x0), int(x1) + 1):
+                bucket = row * self.__cols + col
+                found.update(self.__bucketCircles[self.__bucketStart[bucket]:self.__bucketStart[bucket + 1]].tolist())
+        return [self.__circles[i] for i in sorted(found)]
+
+
+def indexCircles(circles, window):
+    """This function returns a CircleGrid over the circles when there are enough
+       of them for the index to pay off, and the circles unchanged otherwise
+    """
+    if isinstance(circles, CircleGrid) or len(circles) < SPATIAL_INDEX_MIN_CIRCLES:
+        return circles
+    return CircleGrid(circles, window)
+
+
+if __name__ == '__main__':
+    from geometry import doesArmTouchObjects, doArmsTouchObjects, doArmTipsTouchGoals
+    # geometry checks against the class of the imported module, not of __main__
+    from spatial import CircleGrid
+
+    # Indexed collision tests must give the same booleans as testing every
+    # circle, including for circles and links that leave the window.
+    rng = np.random.default_rng(0)
+    window = (300, 200)
+    circles = [(int(x), int(y), int(r)) for x, y, r in
+               zip(rng.integers(-20, 320, 200), rng.integers(-20, 220, 200), rng.integers(1, 15, 200))]
+    grid = CircleGrid(circles, window)
+    jointsX = rng.integers(-30, 330, (2000, 3))
+    jointsY = rng.integers(-30, 230, (2000, 3))
+    distances = [4, 2]
+    for isGoal in [False, True]:
+        expected = doArmsTouchObjects(jointsX, jointsY, distances, circles, isGoal)
+        assert (doArmsTouchObjects(jointsX, jointsY, distances, grid, isGoal) == expected).all()
+        for pose in range(0, len(jointsX), 50):
+            armPosDist = [((jointsX[pose, i], jointsY[pose, i]), (jointsX[pose, i + 1], jointsY[pose, i + 1]), distances[i])
+                          for i in range(len(distances))]
+            assert doesArmTouchObjects(armPosDist, grid, isGoal) == expected[pose]
+    expected = doArmTipsTouchGoals(jointsX[:, -1], jointsY[:, -1], circles)
+    assert (doArmTipsTouchGoals(jointsX[:, -1], jointsY[:, -1], grid) == expected).all()
+
+    print("Test passed\n")
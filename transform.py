@@ -13,16 +13,423 @@ This file contains the transform function that converts the robot arm map
 to the maze.
 """
 import copy
+import hashlib
 import math
+import os
+import numpy as np
+import metrics
+from concurrent.futures import ProcessPoolExecutor
 from arm import Arm
-from maze import Maze
+from maze import Maze, LazyMaze, loadMaze
+from spatial import indexCircles
 from search import *
 from geometry import *
 from const import *
 from util import *
 
-def transformToMaze(arm, goals, obstacles, window, granularity):
+def transformToMaze(arm, goals, obstacles, window, granularity, workers=1):
     """This function transforms the given 2D map to the maze in MP1.
+
+        The maze has one dimension per arm link (alpha, beta, gamma). Every
+        cell of the configuration space is classified at once with NumPy: the
+        joint positions of all angle combinations are computed as arrays and
+        tested against all obstacles and goals in a single pass.
+        transformToMazeScalar is the cell-by-cell reference implementation.
+
+        Args:
+            arm (Arm): arm instance
+            goals (list): [(x, y, r)] of goals
+            obstacles (list): [(x, y, r)] of obstacles
+            window (tuple): (width, height) of the window
+            granularity (int): unit of increasing/decreasing degree for angles
+            workers (int): number of processes to split the alpha range across
+
+        Return:
+            Maze: the maze instance generated based on input arguments.
+
+    """
+    limits = arm.getArmLimit()
+    grid = transformToGrid(arm, goals, obstacles, window, granularity, workers)
+
+    startIdx = angleToIdx(arm.getArmAngle(), [limit[0] for limit in limits], granularity)
+    if grid[startIdx] == SPACE_CODE:
+        grid[startIdx] = START_CODE
+
+    return Maze(grid, tuple(limit[0] for limit in limits), granularity)
+
+
+def transformToGrid(arm, goals, obstacles, window, granularity, workers=1):
+    """This function returns the cells transformToMaze classifies, as an array
+       of character codes with one dimension per arm link and no start marked.
+       Unlike a Maze, the grid needs neither a free start nor an objective.
+    """
+    dims = getMazeDimensions(arm.getArmLimit(), granularity)
+    grid = np.empty(int(np.prod(dims)), dtype=np.uint8)
+    if workers > 1:
+        # Every alpha row is independent; hand out a few slices of rows per
+        # worker so that uneven slices still keep all workers busy.
+        rowSize = len(grid) // dims[ALPHA]
+        bounds = np.linspace(0, dims[ALPHA], min(dims[ALPHA], workers * 4) + 1).astype(int) * rowSize
+        slices = list(zip(bounds[:-1], bounds[1:]))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(classifyCellRange, arm, goals, obstacles, window, granularity, start, stop)
+                    for start, stop in slices]
+            for (start, stop), job in zip(slices, jobs):
+                grid[start:stop] = job.result()
+    else:
+        grid[:] = classifyCellRange(arm, goals, obstacles, window, granularity, 0, len(grid))
+    return grid.reshape(dims)
+
+
+def transformToMazeMultires(arm, goals, obstacles, window, granularity, blockSize=MULTIRES_BLOCK_SIZE):
+    """This function builds the same maze as transformToMaze, coarse to fine.
+
+        The configuration space is cut into blocks of blockSize cells per
+        angle. Each block is classified once from its center pose, with
+        every joint grown by a conservative bound on how far it can move
+        within the block: length x angular span of every link before it,
+        plus the integer truncation of the joint positions. Blocks whose
+        cells must all get the same character are filled at once; the
+        others are halved until they are two cells wide, and their cells
+        are classified one by one.
+
+        Args:
+            arm (Arm): arm instance
+            goals (list): [(x, y, r)] of goals
+            obstacles (list): [(x, y, r)] of obstacles
+            window (tuple): (width, height) of the window
+            granularity (int): unit of increasing/decreasing degree for angles
+            blockSize (int): edge length of the coarsest blocks, a power of two
+
+        Return:
+            Maze: the maze instance generated based on input arguments.
+    """
+    limits = arm.getArmLimit()
+    dims = getMazeDimensions(limits, granularity)
+    offsets = tuple(limit[0] for limit in limits)
+    goals, obstacles = indexCircles(goals, window), indexCircles(obstacles, window)
+    grid = np.full(dims, UNKNOWN_CODE, dtype=np.uint8)
+
+    size = blockSize
+    blocks = np.stack(np.meshgrid(*[np.arange(0, dim, size) for dim in dims], indexing='ij'), axis=-1).reshape(-1, len(dims))
+    while size > 1 and len(blocks):
+        codes = classifyBlocks(arm, blocks, size, dims, offsets, granularity, goals, obstacles, window)
+        decided = codes != UNKNOWN_CODE
+        # Spread the decided block codes over their cells
+        level = np.full([-(-dim // size) for dim in dims], UNKNOWN_CODE, dtype=np.uint8)
+        level[tuple((blocks[decided] // size).T)] = codes[decided]
+        for axis in range(len(dims)):
+            level = np.repeat(level, size, axis=axis)
+        level = level[tuple(slice(0, dim) for dim in dims)]
+        np.copyto(grid, level, where=level != UNKNOWN_CODE)
+
+        blocks = blocks[~decided]
+        if size > 2:
+            size //= 2
+            children = np.stack(np.meshgrid(*[[0, size]] * len(dims), indexing='ij'), axis=-1).reshape(-1, len(dims))
+            blocks = (blocks[:, None, :] + children[None, :, :]).reshape(-1, len(dims))
+            blocks = blocks[(blocks < dims).all(axis=1)]
+        else:
+            break
+
+    # Cells of blocks that stayed ambiguous down to the last level
+    flat = np.nonzero(grid.reshape(-1) == UNKNOWN_CODE)[0]
+    for chunk in range(0, len(flat), CELL_CHUNK_SIZE):
+        idx = np.unravel_index(flat[chunk:chunk + CELL_CHUNK_SIZE], dims)
+        angles = np.stack([i * granularity + offset for i, offset in zip(idx, offsets)], axis=1).astype(np.int64)
+        grid.reshape(-1)[flat[chunk:chunk + CELL_CHUNK_SIZE]] = classifyAngles(arm, angles, goals, obstacles, window)
+
+    startIdx = angleToIdx(arm.getArmAngle(), offsets, granularity)
+    if grid[startIdx] == SPACE_CODE:
+        grid[startIdx] = START_CODE
+
+    return Maze(grid, offsets, granularity)
+
+
+def classifyBlocks(arm, blocks, size, dims, offsets, granularity, goals, obstacles, window):
+    """This function returns the maze character code every cell of each block
+       must have, or UNKNOWN_CODE for blocks whose cells may differ
+
+        Args:
+            blocks (ndarray): (numBlocks, numLinks) index of the first cell of every block
+            size (int): edge length of the blocks in cells, cut off at dims
+    """
+    if metrics.enabled:
+        metrics.count('blocks_classified', len(blocks))
+    eps = 1e-6
+    last = np.minimum(blocks + size, dims) - 1
+    # Center angle and half span of every block and link, in degrees
+    center = (blocks + last) * (granularity / 2.0) + np.asarray(offsets, dtype=np.float64)
+    halfSpan = (last - blocks) * (granularity / 2.0)
+
+    base = arm.getBase()
+    jointsX = [np.full(len(blocks), float(base[0]))]
+    jointsY = [np.full(len(blocks), float(base[1]))]
+    reach = [np.zeros(len(blocks))]
+    totalAngle = np.zeros(len(blocks))
+    totalSpan = np.zeros(len(blocks))
+    for i, length in enumerate(arm.getArmLengths()):
+        totalAngle = totalAngle + center[:, i]
+        totalSpan = totalSpan + np.radians(halfSpan[:, i])
+        jointsX.append(jointsX[-1] + length * np.cos(np.radians(totalAngle)))
+        jointsY.append(jointsY[-1] - length * np.sin(np.radians(totalAngle)))
+        # A chord is never longer than its arc, nor than the circle's diameter
+        reach.append(reach[-1] + np.minimum(length * totalSpan, 2 * length) + MULTIRES_TRUNCATION_SLACK)
+
+    def circleArrays(circles):
+        circles = np.asarray(list(circles), dtype=np.float64).reshape(-1, 3)
+        return circles[:, 0], circles[:, 1], circles[:, 2]
+
+    def touchBounds(circles, padding):
+        # (may touch, must touch) of any link and any of the circles
+        mayTouch = np.zeros(len(blocks), dtype=bool)
+        mustTouch = np.zeros(len(blocks), dtype=bool)
+        cx, cy, radius = circleArrays(circles)
+        for i in range(len(jointsX) - 1):
+            distance = segmentCircleDistances(jointsX[i][:, None], jointsY[i][:, None],
+                                              jointsX[i + 1][:, None], jointsY[i + 1][:, None], cx, cy)
+            limit = radius + (0 if padding is None else padding[i])
+            slack = reach[i + 1][:, None]
+            mayTouch |= (distance - slack <= limit + eps).any(axis=1)
+            mustTouch |= (distance + slack < limit - eps).any(axis=1)
+        return mayTouch, mustTouch
+
+    # Outside the window: some joint may leave it / some joint must be out of it
+    mayLeave = np.zeros(len(blocks), dtype=bool)
+    mustLeave = np.zeros(len(blocks), dtype=bool)
+    for x, y, r in zip(jointsX, jointsY, reach):
+        mayLeave |= (x - r < 0) | (x + r > window[0]) | (y - r < 0) | (y + r > window[1])
+        mustLeave |= (x + r < 0) | (x - r > window[0]) | (y + r < 0) | (y - r > window[1])
+
+    gx, gy, gr = circleArrays(goals)
+    tipDistance = np.hypot(gx - jointsX[-1][:, None], gy - jointsY[-1][:, None])
+    mayReachGoal = (tipDistance - reach[-1][:, None] <= gr + eps).any(axis=1)
+    mustReachGoal = (tipDistance + reach[-1][:, None] < gr - eps).any(axis=1)
+
+    rules = [
+        (WALL_CODE, mayLeave, mustLeave),
+        (OBJECTIVE_CODE, mayReachGoal, mustReachGoal),
+        (WALL_CODE,) + touchBounds(obstacles, arm.getArmDistances()),
+        (WALL_CODE,) + touchBounds(goals, None),
+    ]
+    # Follow the rules of classifyAngles with three-valued predicates,
+    # collecting every code some cell of the block could end up with.
+    reachable = np.ones(len(blocks), dtype=bool)
+    possible = {WALL_CODE: np.zeros(len(blocks), dtype=bool),
+                OBJECTIVE_CODE: np.zeros(len(blocks), dtype=bool),
+                SPACE_CODE: np.zeros(len(blocks), dtype=bool)}
+    for code, mayHold, mustHold in rules:
+        possible[code] |= reachable & mayHold
+        reachable &= ~mustHold
+    possible[SPACE_CODE] |= reachable
+
+    codes = np.full(len(blocks), UNKNOWN_CODE, dtype=np.uint8)
+    numPossible = sum(mask.astype(int) for mask in possible.values())
+    for code, mask in possible.items():
+        codes[mask & (numPossible == 1)] = code
+    return codes
+
+
+def updateMaze(maze, arm, goals, obstacles, window, changedGoals=None, changedObstacles=None):
+    """This function returns the maze transformToMaze would build after some
+       goals or obstacles were added or removed, by only reclassifying the
+       cells those circles can affect.
+
+        A cell can only change if some link, grown by its padding, can reach
+        a changed circle. Cells whose padded link bounding boxes all miss the
+        bounding boxes of the changed circles keep their old character.
+
+        Args:
+            maze (Maze): maze built with transformToMaze or transformToLazyMaze for the scene before the edit
+            arm (Arm): arm instance the maze was built for
+            goals (list): [(x, y, r)] of goals after the edit
+            obstacles (list): [(x, y, r)] of obstacles after the edit
+            window (tuple): (width, height) of the window
+            changedGoals (list): [(x, y, r)] of goals that were added or removed, None for none
+            changedObstacles (list): [(x, y, r)] of obstacles that were added or removed, None for none
+
+        Return:
+            Maze: a new maze, equal to the one transformToMaze builds for the edited scene.
+    """
+    limits = arm.getArmLimit()
+    granularity = maze.granularity
+    distances = arm.getArmDistances()
+    startFlat = maze.getStartFlat()
+    # Cells a lazy maze has not classified yet are unknown, not free, and the
+    # unaffected ones are copied as they are
+    if isinstance(maze, LazyMaze):
+        maze.classifyAll()
+    cells = np.array(maze.getCells())
+    # (x, y, r) of every changed circle, with r already grown by the link padding
+    # for obstacles; goals touch links without padding.
+    changed = [(x, y, r, True) for x, y, r in changedObstacles or []] + \
+              [(x, y, r, False) for x, y, r in changedGoals or []]
+    goals, obstacles = indexCircles(goals, window), indexCircles(obstacles, window)
+
+    for start in range(0, len(cells), CELL_CHUNK_SIZE):
+        angles = gridAngles(limits, granularity, start, start + CELL_CHUNK_SIZE)
+        jointsX, jointsY = arm.jointPositions(angles)
+        affected = np.zeros(len(angles), dtype=bool)
+        for i in range(len(distances)):
+            minX = np.minimum(jointsX[:, i], jointsX[:, i + 1])
+            maxX = np.maximum(jointsX[:, i], jointsX[:, i + 1])
+            minY = np.minimum(jointsY[:, i], jointsY[:, i + 1])
+            maxY = np.maximum(jointsY[:, i], jointsY[:, i + 1])
+            for x, y, r, padded in changed:
+                reach = r + (distances[i] if padded else 0)
+                affected |= (minX - reach <= x) & (x <= maxX + reach) & (minY - reach <= y) & (y <= maxY + reach)
+
+        idx = np.nonzero(affected)[0]
+        if len(idx) == 0:
+            continue
+        codes = classifyAngles(arm, angles[idx], goals, obstacles, window)
+        codes[(idx + start == startFlat) & (codes == SPACE_CODE)] = START_CODE
+        cells[idx + start] = codes
+
+    return Maze(cells.reshape(maze.getDimensions()), maze.offsets, granularity)
+
+
+def transformToMazeCached(arm, goals, obstacles, window, granularity, cacheDir, workers=1):
+    """This function returns the same maze as transformToMaze, reusing the
+       result of an earlier run with the same map and granularity if one is
+       stored in cacheDir.
+
+        Mazes are stored as binary maze files (see Maze.saveToBinaryFile),
+        named by mazeCacheKey. A cached maze is memory-mapped copy-on-write by
+        loadMaze, so loading it costs next to nothing and changes to it never
+        reach the file.
+    """
+    path = os.path.join(cacheDir, mazeCacheKey(arm, goals, obstacles, window, granularity) + BINARY_MAZE_SUFFIX)
+    if os.path.exists(path):
+        try:
+            return loadMaze(path)
+        except (OSError, ValueError, KeyError):
+            print("Ignoring unreadable maze cache file", path)
+
+    maze = transformToMaze(arm, goals, obstacles, window, granularity, workers)
+    os.makedirs(cacheDir, exist_ok=True)
+    # Write to a private file first so that readers never see a partial maze.
+    tmpPath = "%s.%d.tmp" % (path, os.getpid())
+    maze.saveToBinaryFile(tmpPath)
+    os.replace(tmpPath, path)
+    return maze
+
+
+def mazeCacheKey(arm, goals, obstacles, window, granularity, withStart=True):
+    """This function returns a hex digest identifying the maze transformToMaze
+       builds for the given arguments. Without the start, the key identifies
+       the cells of the maze for every start the arm may have.
+    """
+    start = tuple(arm.getArmAngle()) if withStart else None
+    scene = (MAZE_CACHE_VERSION, tuple(window), tuple(arm.getBase()),
+             tuple(arm.getArmLengths()), start, tuple(arm.getArmDistances()),
+             tuple(tuple(limit) for limit in arm.getArmLimit()),
+             tuple(map(tuple, obstacles)), tuple(map(tuple, goals)), granularity)
+    return hashlib.sha256(repr(scene).encode()).hexdigest()
+
+
+def transformToLazyMaze(arm, goals, obstacles, window, granularity):
+    """This function returns a maze for the given 2D map whose cells are only
+       classified when a search first looks at them.
+
+        It takes the same arguments as transformToMaze and its cells agree
+        with the maze transformToMaze builds, but the cost grows with the
+        number of cells the search touches instead of the size of the whole
+        configuration space.
+    """
+    limits = arm.getArmLimit()
+    dims = getMazeDimensions(limits, granularity)
+    offsets = tuple(limit[0] for limit in limits)
+    goals, obstacles = indexCircles(goals, window), indexCircles(obstacles, window)
+
+    def flatAngles(flats):
+        idx = np.unravel_index(flats, dims)
+        return np.stack([i * granularity + offset for i, offset in zip(idx, offsets)], axis=1).astype(np.int64)
+
+    def classify(flats):
+        return classifyAngles(arm, flatAngles(flats), goals, obstacles, window)
+
+    def findObjectives():
+        # A cell is an objective when the arm is inside the window and its
+        # tip touches a goal, so only the joint positions are needed here.
+        objectives = []
+        total = int(np.prod(dims))
+        for start in range(0, total, CELL_CHUNK_SIZE):
+            jointsX, jointsY = arm.jointPositions(gridAngles(limits, granularity, start, start + CELL_CHUNK_SIZE))
+            hit = areArmsWithinWindow(jointsX, jointsY, window) & \
+                  doArmTipsTouchGoals(jointsX[:, -1], jointsY[:, -1], goals)
+            objectives.append(np.nonzero(hit)[0] + start)
+        return np.concatenate(objectives)
+
+    start = idxToAngle(angleToIdx(arm.getArmAngle(), offsets, granularity), offsets, granularity)
+    return LazyMaze(dims, offsets, granularity, start, classify, findObjectives)
+
+
+def getMazeDimensions(limits, granularity):
+    """This function returns the number of cells along each angle of the maze
+    """
+    return tuple(int((limit[1] - limit[0]) / granularity) + 1 for limit in limits)
+
+
+def gridAngles(limits, granularity, start=0, stop=None):
+    """This function returns the (numCells, numLinks) angles of the maze cells
+       whose row-major flat index lies in [start, stop)
+    """
+    dims = getMazeDimensions(limits, granularity)
+    total = int(np.prod(dims))
+    stop = total if stop is None else min(stop, total)
+    idx = np.unravel_index(np.arange(start, stop, dtype=np.int64), dims)
+    return np.stack([i * granularity + limit[0] for i, limit in zip(idx, limits)], axis=1).astype(np.int64)
+
+
+def classifyCellRange(arm, goals, obstacles, window, granularity, start, stop):
+    """This function returns the maze character codes of the cells whose flat
+       index lies in [start, stop), classified CELL_CHUNK_SIZE cells at a time
+    """
+    codes = np.empty(stop - start, dtype=np.uint8)
+    limits = arm.getArmLimit()
+    goals, obstacles = indexCircles(goals, window), indexCircles(obstacles, window)
+    for chunk in range(start, stop, CELL_CHUNK_SIZE):
+        angles = gridAngles(limits, granularity, chunk, min(chunk + CELL_CHUNK_SIZE, stop))
+        codes[chunk - start:chunk - start + len(angles)] = classifyAngles(arm, angles, goals, obstacles, window)
+    return codes
+
+
+def classifyAngles(arm, angles, goals, obstacles, window):
+    """This function returns the maze character code (uint8) of every row of angles,
+       following the same rules as transformToMazeScalar. Goals and obstacles
+       may be lists or CircleGrid indexes of them.
+    """
+    if metrics.enabled:
+        metrics.count('cells_classified', len(angles))
+    goals, obstacles = indexCircles(goals, window), indexCircles(obstacles, window)
+    jointsX, jointsY = arm.jointPositions(angles)
+    distances = arm.getArmDistances()
+    cells = np.full(angles.shape[0], SPACE_CODE, dtype=np.uint8)
+
+    # Each rule only applies to cells that no earlier rule has claimed.
+    undecided = ~areArmsWithinWindow(jointsX, jointsY, window)
+    cells[undecided] = WALL_CODE
+    undecided = ~undecided
+
+    rules = [
+        (OBJECTIVE_CODE, lambda x, y: doArmTipsTouchGoals(x[:, -1], y[:, -1], goals)),
+        (WALL_CODE, lambda x, y: doArmsTouchObjects(x, y, distances, obstacles)),
+        (WALL_CODE, lambda x, y: doArmsTouchObjects(x, y, distances, goals, isGoal=True)),
+    ]
+    for code, rule in rules:
+        idx = np.nonzero(undecided)[0]
+        if len(idx) == 0:
+            break
+        hit = rule(jointsX[idx], jointsY[idx])
+        cells[idx[hit]] = code
+        undecided[idx[hit]] = False
+    return cells
+
+
+def transformToMazeScalar(arm, goals, obstacles, window, granularity):
+    """This function transforms the given 2D map to the maze in MP1, one cell at a time.
+       It is kept as the reference implementation for transformToMaze.
     
         Args:
             arm (Arm): arm instance
@@ -36,56 +443,79 @@ def transformToMaze(arm, goals, obstacles, window, granularity):
 
     """
 
-    #create new maze with dims = (range of angle) / granulity
-    dims = arm.getArmLimit().copy()
-    for i in range(len(dims)):
-        dims[i] = int((dims[i][1] - dims[i][0]) / granularity) + 1
-    maze = []
-    for i in range(dims[0]):
-        column = []
-        for j in range(dims[1]):
-            column.append(" ")
-        maze.append(column)
-    startAngles = []
-    for i in range(len(arm.getArmAngle())):
-        startAngles.append(int((arm.getArmAngle()[i] - arm.getArmLimit()[i][0]) / granularity))
-
-    maze[startAngles[0]][startAngles[1]] = "P" #start point
-
-    for i in range(dims[0]):
-        longways = ""
-        for j in range(dims[1]):
-            alpha = int(i * granularity + arm.getArmLimit()[0][0])
-            beta = int(j * granularity + arm.getArmLimit()[1][0])
-            arm.setArmAngle((alpha, beta))
-            armPos = arm.getArmPos()
-            ty = 0
-            if isArmWithinWindow(armPos, window) is False:
-                maze[i][j] = "%"
-                ty = 1
-            elif doesArmTipTouchGoals(arm.getEnd(), goals) is True:
-                maze[i][j] = "."
-            elif doesArmTouchObjects(arm.getArmPosDist(), obstacles, False) is True:
-                maze[i][j] = "%"
-                ty = 2
-            elif doesArmTouchObjects(arm.getArmPosDist(), goals, True) is True:
-                maze[i][j] = "%"
-                ty = 3
-            elif maze[i][j] == "P":
-                print("I FOUND THE P!")
-            else:
-                maze[i][j] = " "
-
-
-            if ty == 1 or ty == 0:
-                longways += maze[i][j]
-            elif ty == 2:
-                longways += "#"
-            elif ty == 3:
-                longways += "$"
-        print(longways)
-
-
-    retMaze = Maze(maze, (arm.getArmLimit()[0][0], arm.getArmLimit()[1][0]), granularity)
+    limits = arm.getArmLimit()
+    dims = getMazeDimensions(limits, granularity)
+    offsets = tuple(limit[0] for limit in limits)
+    maze = np.full(dims, SPACE_CHAR, dtype='<U1')
+    maze[angleToIdx(arm.getArmAngle(), offsets, granularity)] = START_CHAR #start point
+
+    for idx in np.ndindex(*dims):
+        arm.setArmAngle(idxToAngle(idx, offsets, granularity))
+        armPos = arm.getArmPos()
+        if isArmWithinWindow(armPos, window) is False:
+            maze[idx] = "%"
+        elif doesArmTipTouchGoals(arm.getEnd(), goals) is True:
+            maze[idx] = "."
+        elif doesArmTouchObjects(arm.getArmPosDist(), obstacles, False) is True:
+            maze[idx] = "%"
+        elif doesArmTouchObjects(arm.getArmPosDist(), goals, True) is True:
+            maze[idx] = "%"
+        elif maze[idx] != "P":
+            maze[idx] = " "
+
+    retMaze = Maze(maze, offsets, granularity)
     #retMaze.saveToFile("check2.txt")
-    return retMaze
\ No newline at end of file
+    return retMaze
+
+
+if __name__ == '__main__':
+    import contextlib
+    import io
+    import tempfile
+
+    # The vectorized transform must agree with the scalar reference cell for
+    # cell, for the 2-link maps as well as the 1- and 3-link part 4 maps.
+    for configfile, granularities in [(CONFIG_FILE, [2, 5]), ("test_config_part4.txt", [10])]:
+        for map_name in getMapNames(configfile):
+            for granularity in granularities:
+                window, armBase, armLinks, obstacles, goals = loadMapConfig(configfile, map_name)
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expected = transformToMazeScalar(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+                result = transformToMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+                assert result.get_map() == expected.get_map(), (map_name, granularity)
+
+                parallel = transformToMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity, workers=3)
+                assert parallel.getCells().tobytes() == result.getCells().tobytes(), (map_name, granularity)
+
+                for blockSize in [4, MULTIRES_BLOCK_SIZE]:
+                    multires = transformToMazeMultires(Arm(armBase, armLinks), goals, obstacles, window, granularity, blockSize)
+                    assert multires.getCells().tobytes() == result.getCells().tobytes(), (map_name, granularity, blockSize)
+
+                # Nudging one obstacle and one goal must give the same maze as a rebuild.
+                movedObstacles = [(x + 6, y - 4, r) for x, y, r in obstacles[:1]] + obstacles[1:]
+                movedGoals = [(x - 2, y + 2, r) for x, y, r in goals[:1]] + goals[1:]
+                rebuilt = transformToMaze(Arm(armBase, armLinks), movedGoals, movedObstacles, window, granularity)
+                updated = updateMaze(result, Arm(armBase, armLinks), movedGoals, movedObstacles, window,
+                                     goals[:1] + movedGoals[:1], obstacles[:1] + movedObstacles[:1])
+                assert updated.get_map() == rebuilt.get_map(), (map_name, granularity)
+                lazy = transformToLazyMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+                updated = updateMaze(lazy, Arm(armBase, armLinks), movedGoals, movedObstacles, window,
+                                     goals[:1] + movedGoals[:1], obstacles[:1] + movedObstacles[:1])
+                assert updated.get_map() == rebuilt.get_map(), (map_name, granularity)
+
+                # Both file formats must read back to the same maze.
+                with tempfile.TemporaryDirectory() as tmpDir:
+                    result.saveToBinaryFile(os.path.join(tmpDir, "maze" + BINARY_MAZE_SUFFIX))
+                    result.saveToFile(os.path.join(tmpDir, "maze.txt"))
+                    for loaded in [loadMaze(os.path.join(tmpDir, "maze" + BINARY_MAZE_SUFFIX)),
+                                   loadMaze(os.path.join(tmpDir, "maze.txt"), result.offsets, granularity)]:
+                        assert loaded.get_map() == result.get_map(), (map_name, granularity)
+                        assert loaded.getStart() == result.getStart(), (map_name, granularity)
+                        assert loaded.getObjectives() == result.getObjectives(), (map_name, granularity)
+
+                lazy = transformToLazyMaze(Arm(armBase, armLinks), goals, obstacles, window, granularity)
+                assert lazy.getObjectives() == result.getObjectives(), (map_name, granularity)
+                assert lazy.get_map() == result.get_map(), (map_name, granularity)
+
+    print("Test passed\n")
@@ -12,6 +12,8 @@
 This file contains helper functions that helps other modules, 
 """
 
+import configparser
+
 # Transform between angles (alpha, beta, gamma) and array index
 def angleToIdx(angles, offsets, granularity):
     result = []
@@ -29,4 +31,21 @@ def isValueInBetween(valueRange, target):
     if target < min(valueRange) or target > max(valueRange):
         return False
     else:
-        return True
\ No newline at end of file
+        return True
+
+def loadMapConfig(configfile, map_name):
+    """This function reads one map section of a configuration file and returns
+       (window, armBase, armLinks, obstacles, goals) as written in the file
+    """
+    config = configparser.ConfigParser()
+    if not config.read(configfile):
+        raise FileNotFoundError(configfile)
+    return tuple(eval(config.get(map_name, key)) for key in ['Window', 'ArmBase', 'ArmLinks', 'Obstacles', 'Goals'])
+
+def getMapNames(configfile):
+    """This function returns the names of the map sections of a configuration file
+    """
+    config = configparser.ConfigParser()
+    if not config.read(configfile):
+        raise FileNotFoundError(configfile)
+    return config.sections()